@@ -2,19 +2,16 @@ from fastapi import HTTPException, status
 from firebase_admin import firestore # type: ignore
 from typing import List
 
+from api.services.utils.firestore_db import get_collection
 from api.services.utils.get_next_db_id import get_next_id
 from api.models import purchase_orders as po_models
 from api.models.response import ResponseMsg
 
-# Create reference to purchase_orders collection
-db = firestore.client() # type: ignore
-po_collection = db.collection("purchase_orders")
-
 def create_purchase_order(po: po_models.PurchaseOrderDB) -> po_models.PurchaseOrderOut:
   try:
     new_id = get_next_id(document="purchase_orders")
     po_data = po.model_dump()
-    po_collection.document(new_id).set(po_data) # type: ignore
+    get_collection("purchase_orders").document(new_id).set(po_data) # type: ignore
     return po_models.PurchaseOrderOut(**po_data, id=int(new_id))
   
   except Exception as e:
@@ -25,7 +22,7 @@ def create_purchase_order(po: po_models.PurchaseOrderDB) -> po_models.PurchaseOr
 
 def get_all_purchase_orders() -> List[po_models.PurchaseOrderOut]:
   try:
-    po_docs = po_collection.stream()
+    po_docs = get_collection("purchase_orders").stream()
     purchase_orders = [
       po_models.PurchaseOrderOut(**doc.to_dict(), id=int(doc.id)) # type: ignore
       for doc in po_docs # type: ignore
@@ -40,7 +37,7 @@ def get_all_purchase_orders() -> List[po_models.PurchaseOrderOut]:
 
 def get_purchase_order(id: int) -> po_models.PurchaseOrderOut:
   try:
-    po_ref = po_collection.document(str(id))
+    po_ref = get_collection("purchase_orders").document(str(id))
     po_doc = po_ref.get() # type: ignore
 
     if not po_doc.exists:
@@ -65,7 +62,7 @@ def update_purchase_order(
   id: int, updates: po_models.UpdatePurchaseOrder
 ) -> ResponseMsg:
   try:
-    po_ref = po_collection.document(str(id))
+    po_ref = get_collection("purchase_orders").document(str(id))
     
     updated_data = updates.model_dump(exclude_none=True)
     po_ref.update(updated_data) # type: ignore
@@ -80,7 +77,7 @@ def update_purchase_order(
   
 def add_log_to_purchase_order(id: int, log: po_models.Log) -> ResponseMsg:
   try:
-    po_ref = po_collection.document(str(id))
+    po_ref = get_collection("purchase_orders").document(str(id))
     
     po_ref.update({"logs": firestore.ArrayUnion([log.model_dump()])}) # type: ignore
     
@@ -94,7 +91,7 @@ def add_log_to_purchase_order(id: int, log: po_models.Log) -> ResponseMsg:
   
 def delete_purchase_order(id: int) -> ResponseMsg:
   try:
-    po_ref = po_collection.document(str(id))
+    po_ref = get_collection("purchase_orders").document(str(id))
 
     if not po_ref.get().exists: # type: ignore
       raise HTTPException(
@@ -1,16 +1,12 @@
 from fastapi import HTTPException, status
-from firebase_admin import firestore # type: ignore
 
+from api.services.utils.firestore_db import get_collection
 from api.models import settings as settings_models
 from api.models.response import ResponseMsg
 
-# Create reference to purchase_orders collection
-db = firestore.client() # type: ignore
-settings_collection = db.collection("settings")
-
 def get_breakdown_net_sales_settings() -> settings_models.BreakdownNetSalesSettings:
   try:
-    doc_ref = settings_collection.document("breakdown_net_sales")
+    doc_ref = get_collection("settings").document("breakdown_net_sales")
     settings_doc = doc_ref.get() # type: ignore
 
     if not settings_doc.exists:
@@ -35,7 +31,7 @@ def update_breakdown_net_sales_settings(
   updates: settings_models.UpdateBreakdownNetSalesSettings
 ) -> ResponseMsg:
   try:
-    doc_ref = settings_collection.document("breakdown_net_sales")
+    doc_ref = get_collection("settings").document("breakdown_net_sales")
     
     updated_data = updates.model_dump(exclude_none=True)
     doc_ref.update(updated_data) # type: ignore
@@ -50,7 +46,7 @@ def update_breakdown_net_sales_settings(
   
 def get_sellercloud_settings() -> settings_models.SellercloudSettings:
   try:
-    doc_ref = settings_collection.document("sellercloud")
+    doc_ref = get_collection("settings").document("sellercloud")
     settings_doc = doc_ref.get() # type: ignore
 
     if not settings_doc.exists:
@@ -73,7 +69,7 @@ def get_sellercloud_settings() -> settings_models.SellercloudSettings:
   
 def get_lightspeed_settings() -> settings_models.LightspeedSettings:
   try:
-    doc_ref = settings_collection.document("lightspeed")
+    doc_ref = get_collection("settings").document("lightspeed")
     settings_doc = doc_ref.get() # type: ignore
 
     if not settings_doc.exists:
@@ -96,7 +92,7 @@ def get_lightspeed_settings() -> settings_models.LightspeedSettings:
   
 def get_ats_settings() -> settings_models.AtsSkuCreationSettings:
   try:
-    doc_ref = settings_collection.document("ats_sku_creation")
+    doc_ref = get_collection("settings").document("ats_sku_creation")
     settings_doc = doc_ref.get() # type: ignore
 
     if not settings_doc.exists:
@@ -121,7 +117,7 @@ def update_ats_settings(
   updates: settings_models.UpdateAtsSkuCreationSettings
 ) -> ResponseMsg:
   try:
-    doc_ref = settings_collection.document("ats_sku_creation")
+    doc_ref = get_collection("settings").document("ats_sku_creation")
     
     updated_data = updates.model_dump()
     doc_ref.update(updated_data) # type: ignore
@@ -136,7 +132,7 @@ def update_ats_settings(
   
 def get_ebay_discount_settings() -> settings_models.EbayDiscountSettings:
   try:
-    doc_ref = settings_collection.document("ebay_discount")
+    doc_ref = get_collection("settings").document("ebay_discount")
     settings_doc = doc_ref.get() # type: ignore
 
     if not settings_doc.exists:
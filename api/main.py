@@ -1,19 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import asyncio
 
-from firebase_admin import credentials, initialize_app # type: ignore
-cred = credentials.Certificate("google-firebase-adminsdk.json")
-initialize_app(credential=cred)
-
-from api.services.cached_data.sales_reports import update_sales_reports
-from api.services.cached_data.marketplaces import update_marketplaces
-from api.services.cached_data.list_prices import update_list_prices
-from api.services.cached_data.item_types import update_item_types
-from api.services.cached_data.brand_codes import update_brand_codes
-from api.services.cached_data.item_type_acronyms import update_item_type_acronyms
-from api.services.cached_data.valid_sizes import update_valid_sizes
+from api.services.cached_data.scheduler import cache_scheduler
+from api.services.google_api.client import close_http_client
 
 from api.routers.cache import router as cache_router
 from api.routers.purchase_orders import router as po_router
@@ -24,34 +14,13 @@ from api.routers.tests import router as tests_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-  list_prices_update_task = asyncio.create_task(update_list_prices(repeat=True))
-  marketplaces_update_task = asyncio.create_task(update_marketplaces(repeat=True))
-  item_types_update_task = asyncio.create_task(update_item_types(repeat=True))
-  sales_report_update_task = asyncio.create_task(update_sales_reports(repeat=True))
-  brand_codes_update_task = asyncio.create_task(update_brand_codes(repeat=True))
-  item_type_acronyms_update_task = asyncio.create_task(update_item_type_acronyms(repeat=True))
-  valid_sizes_update_task = asyncio.create_task(update_valid_sizes(repeat=True))
+  # Load cached data from local snapshots and start the cache refresh loops
+  cache_scheduler.start()
 
   yield
 
-  sales_report_update_task.cancel()
-  marketplaces_update_task.cancel()
-  list_prices_update_task.cancel()
-  item_types_update_task.cancel()
-  brand_codes_update_task.cancel()
-  item_type_acronyms_update_task.cancel()
-  valid_sizes_update_task.cancel()
-
-  try:
-    await sales_report_update_task
-    await marketplaces_update_task
-    await list_prices_update_task
-    await item_types_update_task
-    await brand_codes_update_task
-    await item_type_acronyms_update_task
-    await valid_sizes_update_task
-  except asyncio.CancelledError:
-    pass
+  await cache_scheduler.stop()
+  await close_http_client()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -1,9 +1,27 @@
 from pydantic import BaseModel
+from typing import Dict
 from datetime import datetime
 
 class UpdateStatus(BaseModel):
   update_time: datetime
   status: str
+  from_snapshot: bool = False
+  # The last time a refresh found the data unchanged (the data is not rebuilt in that case)
+  checked_time: datetime | None = None
+
+class RefreshMetrics(BaseModel):
+  refresh_count: int = 0
+  failure_count: int = 0
+  # The following metrics are for the latest refresh
+  duration_seconds: float = 0.0
+  phase_seconds: Dict[str, float] = {}
+  row_count: int = 0
+  memory_bytes: int = 0
+  api_calls: int = 0
+  api_retries: int = 0
+  cells_fetched: int = 0
+  bytes_downloaded: int = 0
 
 class UpdateStatusOut(UpdateStatus):
-  name: str
\ No newline at end of file
+  name: str
+  metrics: RefreshMetrics
\ No newline at end of file
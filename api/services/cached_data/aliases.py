@@ -0,0 +1,245 @@
+from typing import Any, Dict, List
+import time
+
+from api.services.google_api import sheets_utils
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.services.cached_data import snapshots
+from api.services.cached_data import sku_po_tool
+from api.services.utils.mpn_formatter import remove_special_chars
+from api.models.sheets import AliasesCreatedSkusProperties
+
+AliasesIndex = Dict[str, Dict[str, Any]]
+
+# The changes of the index made by the pipelines of all workers, shared through a state file next
+# to the snapshots (see get_shared_changes), and the signature of the state last published here
+ALIASES_STATE_NAME = "aliases"
+published_changes_signature: Any = None
+
+def get_shared_changes() -> Dict[str, Any]:
+  """
+  Returns the changes of the index made by the pipelines of all workers:
+    - "appended_skus": The created SKUs, kept until a refresh fetches them with the sheet or reads
+      the sheet after they were appended (so a refresh that was already running does not drop
+      them). The appended time of a SKU stays None until its append succeeds.
+    - "reserved_sku_numbers": The highest reserved parent SKU number of each brand-type prefix.
+      Reservations are kept even if the SKUs are never uploaded, so a number is never handed out
+      twice.
+  """
+  shared_changes = snapshots.load_shared_state(name=ALIASES_STATE_NAME)
+  if shared_changes is None:
+    return {"appended_skus": [], "reserved_sku_numbers": {}}
+  return shared_changes
+
+def apply_shared_changes(aliases_index: AliasesIndex) -> AliasesIndex:
+  """
+  Returns a copy of the index with the SKUs created and the numbers reserved by the pipelines of
+  all workers added (the index itself is not changed, since it may be published).
+  """
+  shared_changes = get_shared_changes()
+  updated_index: AliasesIndex = {
+    "brand_mpn_dict": dict(aliases_index["brand_mpn_dict"]),
+    "brand_type_numbers": dict(aliases_index["brand_type_numbers"]),
+  }
+
+  for appended_sku in shared_changes["appended_skus"]:
+    sku, mpn = appended_sku["sku"], appended_sku["mpn"]
+    if not is_sku_in_index(aliases_index=updated_index, sku=sku, mpn=mpn):
+      add_sku_to_index(aliases_index=updated_index, sku=sku, mpn=mpn, copy=True)
+
+  brand_type_numbers: Dict[str, int] = updated_index["brand_type_numbers"]
+  for brand_type, sku_number in shared_changes["reserved_sku_numbers"].items():
+    if sku_number > brand_type_numbers.get(brand_type, 0):
+      brand_type_numbers[brand_type] = sku_number
+
+  return updated_index
+
+async def load_aliases() -> AliasesIndex:
+  """
+  This function retrieves the Aliases/Created SKUs rows of the cached SKU/PO Tool spreadsheet and
+  indexes the SKUs by brand code + MPN, and the highest parent SKU number by brand-type prefix.
+  """
+  aliases_rows = sku_po_tool.get_updated_sku_po_tool_rows(ss_properties=AliasesCreatedSkusProperties())
+  fetch_time = sku_po_tool.get_sku_po_tool_fetch_time()
+
+  aliases_index: AliasesIndex = {"brand_mpn_dict": {}, "brand_type_numbers": {}}
+
+  for row in aliases_rows:
+    add_sku_to_index(aliases_index=aliases_index, sku=str(row["Old Custom SKU"]), mpn=str(row["MPN"]))
+
+  # Drop the created SKUs that were fetched with the sheet, or appended before it was fetched
+  with snapshots.hold_shared_lock(name=ALIASES_STATE_NAME):
+    shared_changes = get_shared_changes()
+    shared_changes["appended_skus"] = [
+      appended_sku for appended_sku in shared_changes["appended_skus"]
+      if not is_sku_in_index(
+        aliases_index=aliases_index, sku=appended_sku["sku"], mpn=appended_sku["mpn"],
+      )
+      and (appended_sku["appended_time"] is None or appended_sku["appended_time"] >= fetch_time)
+    ]
+    snapshots.save_shared_state(name=ALIASES_STATE_NAME, state=shared_changes)
+
+  # Add the created SKUs that were not fetched with the sheet (appended while the sheet was being
+  # fetched, or not appended yet), and keep the numbers reserved for SKUs not in the sheet (yet)
+  return apply_shared_changes(aliases_index=aliases_index)
+
+aliases_dataset = CachedDataset(
+  name="aliases", title="Aliases/Created SKUs", load=load_aliases,
+  empty_data={"brand_mpn_dict": {}, "brand_type_numbers": {}},
+  is_empty=lambda data: not data["brand_mpn_dict"],
+  count_rows=lambda data: sum(len(skus) for skus in data["brand_mpn_dict"].values()),
+  dependencies=[sku_po_tool.sku_po_tool_dataset],
+  apply_changes=lambda data: apply_shared_changes(aliases_index=data),
+)
+
+def get_updated_aliases_dicts() -> AliasesIndex:
+  """
+  This function retrieves the latest cached Aliases/Created SKUs index (including the SKUs created
+  by other runs of any worker since the running pipeline started) and validates its data
+  """
+  # Validate the index before adding the changes to it (so an empty index is never published)
+  aliases_dataset.get_updated_data(latest=True)
+  publish_shared_changes()
+  return aliases_dataset.get_updated_data(latest=True)
+
+def publish_shared_changes() -> None:
+  """
+  Publishes the index with the changes made by the pipelines of all workers, if they changed since
+  they were last published by this worker.
+  """
+  global published_changes_signature
+
+  with snapshots.hold_shared_lock(name=ALIASES_STATE_NAME):
+    changes_signature = snapshots.get_shared_state_signature(name=ALIASES_STATE_NAME)
+    if changes_signature == published_changes_signature:
+      return
+
+    # Publish a new version of the index (published data is never changed in place)
+    aliases_dataset.publish(
+      data=apply_shared_changes(aliases_index=aliases_dataset.data),
+      update_time=aliases_dataset.update_status.update_time,
+      from_snapshot=aliases_dataset.update_status.from_snapshot,
+    )
+    published_changes_signature = changes_signature
+
+def reserve_parent_sku_numbers(brand_type_counts: Dict[str, int]) -> Dict[str, int]:
+  """
+  This function reserves new parent SKU numbers for the cached Aliases/Created SKUs index, so runs
+  that assign SKUs at the same time (in any worker, before either has uploaded its SKUs) get
+  different numbers.
+
+  Args:
+    brand_type_counts (Dict[str, int]): The number of parent SKUs to reserve per brand-type prefix.
+
+  Returns:
+    Dict[str, int]: The first reserved number of each brand-type prefix (the numbers that follow
+    it up to its count are reserved too).
+  """
+  if not brand_type_counts:
+    return {}
+
+  with snapshots.hold_shared_lock(name=ALIASES_STATE_NAME):
+    shared_changes = get_shared_changes()
+    # The index includes the reservations of this worker, the shared changes those of all workers
+    brand_type_numbers: Dict[str, int] = aliases_dataset.data["brand_type_numbers"]
+    reserved_sku_numbers: Dict[str, int] = shared_changes["reserved_sku_numbers"]
+    first_numbers: Dict[str, int] = {}
+
+    for brand_type, count in brand_type_counts.items():
+      first_numbers[brand_type] = max(
+        brand_type_numbers.get(brand_type, 0), reserved_sku_numbers.get(brand_type, 0),
+      ) + 1
+      reserved_sku_numbers[brand_type] = first_numbers[brand_type] + count - 1
+
+    snapshots.save_shared_state(name=ALIASES_STATE_NAME, state=shared_changes)
+
+  publish_shared_changes()
+  return first_numbers
+
+async def append_created_skus(rows: List[Dict[str, Any]]) -> None:
+  """
+  This function adds newly created SKUs to the cached Aliases/Created SKUs index of all workers (so
+  the next SKU assignment sees them without reading the sheet again), and appends them to the
+  sheet.
+
+  Args:
+    rows (List[Dict[str, Any]]): The worksheet rows of the created SKUs (with ProductID and MPN).
+  """
+  new_skus = [
+    {"sku": str(row["ProductID"]), "mpn": str(row["MPN"]), "appended_time": None} for row in rows
+  ]
+
+  if not new_skus:
+    return
+
+  with snapshots.hold_shared_lock(name=ALIASES_STATE_NAME):
+    shared_changes = get_shared_changes()
+    shared_changes["appended_skus"].extend(new_skus)
+    snapshots.save_shared_state(name=ALIASES_STATE_NAME, state=shared_changes)
+
+  publish_shared_changes()
+
+  # "New Custom SKU" is only filled for SKUs that were renamed, so it stays empty for new SKUs.
+  # If the append fails, the SKUs keep no appended time and stay in the index until a fetch of the
+  # sheet contains them.
+  await sheets_utils.append_row_dicts_to_spreadsheet(
+    ss_properties=AliasesCreatedSkusProperties(),
+    row_dicts=[{"Old Custom SKU": new_sku["sku"], "MPN": new_sku["mpn"]} for new_sku in new_skus],
+  )
+
+  appended_time = time.time()
+  new_sku_names = {new_sku["sku"] for new_sku in new_skus}
+
+  with snapshots.hold_shared_lock(name=ALIASES_STATE_NAME):
+    shared_changes = get_shared_changes()
+    for appended_sku in shared_changes["appended_skus"]:
+      if appended_sku["sku"] in new_sku_names:
+        appended_sku["appended_time"] = appended_time
+    snapshots.save_shared_state(name=ALIASES_STATE_NAME, state=shared_changes)
+
+def add_sku_to_index(
+  aliases_index: AliasesIndex, sku: str, mpn: str, copy: bool = False,
+) -> None:
+  """
+  Adds a SKU to the brand + MPN lists of the index, and raises the highest number of its brand-type
+  prefix if needed. If copy is True, the brand + MPN list is copied before the SKU is added (for
+  indexes that share their lists with a published index).
+  """
+  brand_mpn = get_brand_mpn(sku=sku, mpn=mpn)
+  brand_mpn_dict: Dict[str, List[str]] = aliases_index["brand_mpn_dict"]
+
+  if brand_mpn not in brand_mpn_dict:
+    brand_mpn_dict[brand_mpn] = [sku]
+  elif copy:
+    brand_mpn_dict[brand_mpn] = [*brand_mpn_dict[brand_mpn], sku]
+  else:
+    brand_mpn_dict[brand_mpn].append(sku)
+
+  brand_type_numbers: Dict[str, int] = aliases_index["brand_type_numbers"]
+  brand_type = get_brand_type_code(sku=sku)
+  sku_number = get_sku_number(sku=sku)
+
+  if sku_number is not None and sku_number > brand_type_numbers.get(brand_type, 0):
+    brand_type_numbers[brand_type] = sku_number
+
+def is_sku_in_index(aliases_index: AliasesIndex, sku: str, mpn: str) -> bool:
+  return sku in aliases_index["brand_mpn_dict"].get(get_brand_mpn(sku=sku, mpn=mpn), [])
+
+def get_brand_mpn(sku: str, mpn: str) -> str:
+  return get_brand_code(sku=sku) + remove_special_chars(mpn=mpn)
+
+def get_brand_code(sku: str) -> str:
+  return sku[:3]
+
+def get_brand_type_code(sku: str) -> str:
+  return sku[:8]
+
+def get_sku_number(sku: str) -> int | None:
+  """
+  Returns the number of the parent SKU (e.g. 12 for ABC-SHOE-0012/10), or None if the SKU does
+  not end in a number.
+  """
+  parent = sku.split("/")[0]
+  try:
+    return int(parent.split("-")[2])
+  except (IndexError, ValueError):
+    return None
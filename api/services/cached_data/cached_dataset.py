@@ -0,0 +1,444 @@
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Mapping, NamedTuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from types import MappingProxyType
+import asyncio
+import hashlib
+import pickle
+import time
+
+from api.services.cached_data import snapshots
+from api.services.utils.send_emails import send_error_email
+from api.services.utils import refresh_metrics as metrics
+from api.models.cache import UpdateStatus, RefreshMetrics
+
+class DatasetVersion(NamedTuple):
+  """
+  The data of a cached dataset as it was published by one refresh (never changed afterwards).
+  """
+  data: Any
+  update_time: datetime
+  from_snapshot: bool
+
+class CacheVersion(NamedTuple):
+  """
+  An immutable view of the published data of all cached datasets. Every publish creates a new
+  cache version with a higher version number and swaps it in as the current version, so readers
+  that hold on to a cache version never see a partial or mixed update.
+  """
+  version: int
+  datasets: Mapping[str, DatasetVersion]
+
+current_cache_version = CacheVersion(version=0, datasets=MappingProxyType({}))
+
+# The cache version pinned by the running pipeline (see pin_cache_version)
+pinned_cache_version: ContextVar[CacheVersion | None] = ContextVar(
+  "pinned_cache_version", default=None,
+)
+
+def get_cache_version() -> CacheVersion:
+  """
+  Returns the cache version pinned by the running pipeline, or the current cache version.
+  """
+  return pinned_cache_version.get() or current_cache_version
+
+@contextmanager
+def pin_cache_version() -> Iterator[CacheVersion]:
+  """
+  Pins the current cache version for the duration of a pipeline run, so all cached data read
+  during the run comes from the same version (even if datasets are refreshed in the meantime).
+  """
+  cache_version = get_cache_version()
+  token = pinned_cache_version.set(cache_version)
+  try:
+    yield cache_version
+  finally:
+    pinned_cache_version.reset(token)
+
+class CachedDataset:
+  """
+  A dataset that is loaded from Google Sheets/Drive and kept in memory.
+
+  The dataset is refreshed by the cache scheduler, retries failed refreshes with exponential
+  backoff, validates its freshness when it is read, and saves a local snapshot after every
+  successful refresh. Refreshed data is published as a new cache version and must not be changed
+  in place afterwards. Refreshes that fetch the same inputs as the published data (compared by a
+  content hash of the fetched inputs, before the data is built from them) keep the published data,
+  so neither the data nor anything derived from it is rebuilt.
+
+  Args:
+    name (str): The name of the dataset (used for snapshots and in the cache routes).
+    title (str): The display name of the dataset (used in logs, errors, and emails).
+    load (Callable[[], Awaitable[Any]]): Fetches the latest data of the dataset (or the inputs it is
+                                        built from, if build is set).
+    empty_data (Any): The data of the dataset before it was loaded.
+    is_empty (Callable[[Any], bool], optional): Checks if the data of the dataset is empty.
+    count_rows (Callable[[Any], int], optional): Counts the rows of the data (for the refresh
+                                                metrics). Defaults to len.
+    refresh_interval (int, optional): Seconds between scheduled refreshes. Defaults to one day.
+    max_age_days (float, optional): Days after which the data is no longer up-to-date.
+    retries (int, optional): The number of attempts for each refresh. Defaults to 5.
+    retry_wait (int, optional): Seconds to wait after the first failed attempt (doubles after each
+                              failed attempt). Defaults to 5.
+    dependencies (List[CachedDataset], optional): The datasets this dataset is built from. The
+                                                 dataset is refreshed after its dependencies, and
+                                                 re-derived whenever one of them is updated.
+    derive (Callable[[], Awaitable[bool]], optional): Rebuilds the dataset from already loaded data
+                                                     and its updated dependencies (without fetching
+                                                     it again). Returns True if it was rebuilt.
+                                                     Defaults to a full refresh.
+    build (Callable[[Any], Any], optional): Builds the data of the dataset from the inputs fetched
+                                           by load. Only called if the inputs changed. Defaults to
+                                           publishing the fetched data as it is.
+    get_content (Callable[[Any], Any], optional): Selects the part of the fetched inputs that is
+                                                 compared between refreshes (e.g. leaving out fetch
+                                                 times, or large data that only changes with small
+                                                 inputs). Defaults to all fetched inputs.
+    apply_changes (Callable[[Any], Any], optional): Returns the data of a snapshot with the changes
+                                                   made to the data outside of refreshes applied
+                                                   (e.g. by pipelines of other workers). Defaults
+                                                   to publishing snapshots as they are.
+  """
+  def __init__(
+    self,
+    name: str,
+    title: str,
+    load: Callable[[], Awaitable[Any]],
+    empty_data: Any,
+    is_empty: Callable[[Any], bool] = lambda data: not data,
+    count_rows: Callable[[Any], int] = len,
+    refresh_interval: int = 86400,
+    max_age_days: float = 1.05,
+    retries: int = 5,
+    retry_wait: int = 5,
+    dependencies: List["CachedDataset"] | None = None,
+    derive: Callable[[], Awaitable[bool]] | None = None,
+    build: Callable[[Any], Any] | None = None,
+    get_content: Callable[[Any], Any] = lambda inputs: inputs,
+    apply_changes: Callable[[Any], Any] | None = None,
+  ) -> None:
+    self.name = name
+    self.title = title
+    self.load = load
+    self.empty_data = empty_data
+    self.is_empty = is_empty
+    self.count_rows = count_rows
+    self.refresh_interval = refresh_interval
+    self.max_age_days = max_age_days
+    self.retries = retries
+    self.retry_wait = retry_wait
+    self.update_listeners: List[Callable[[], Awaitable[None]]] = []
+    self.update_task: asyncio.Task[bool] | None = None
+    self.dependencies: List[CachedDataset] = dependencies or []
+    self.derive = derive
+    self.build = build
+    self.get_content = get_content
+    self.apply_changes = apply_changes
+    self.snapshot_signature: Any = None
+    self.content_hash: str | None = None
+    self.metrics = RefreshMetrics()
+    self.update_status = UpdateStatus(
+      update_time=datetime(year=1899, month=1, day=1),
+      status="Pending Initial Update",
+    )
+
+    # Re-derive this dataset whenever one of its dependencies is updated
+    for dependency in self.dependencies:
+      dependency.add_update_listener(self.handle_dependency_update)
+
+  @property
+  def data(self) -> Any:
+    """
+    The latest published data of the dataset (ignoring pinned cache versions).
+    """
+    dataset_version = current_cache_version.datasets.get(self.name)
+    return self.empty_data if dataset_version is None else dataset_version.data
+
+  def get_updated_data(self, latest: bool = False) -> Any:
+    """
+    Retrieves the data of the dataset (from the cache version pinned by the running pipeline, if
+    any) and validates that it exists and is up-to-date.
+
+    Args:
+      latest (bool, optional): Read the latest published data even if the running pipeline pinned
+                              a cache version (for data that pipelines add to while they run).
+
+    Raises:
+      HTTPException: If the data is empty or older than max_age_days (data loaded from a snapshot
+                    is served until the first successful refresh).
+    """
+    cache_version = current_cache_version if latest else get_cache_version()
+    dataset_version = cache_version.datasets.get(self.name)
+
+    # Raise error if the data is empty
+    if dataset_version is None or self.is_empty(dataset_version.data):
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Could not find {self.title}.",
+      )
+
+    # Check how long it has been since the last update (or since a refresh found the latest data
+    # unchanged)
+    last_update_time = dataset_version.update_time
+    checked_time = self.update_status.checked_time
+    if checked_time is not None and dataset_version.data is self.data:
+      last_update_time = max(last_update_time, checked_time)
+
+    time_since_update = datetime.now() - last_update_time
+
+    # Raise error if the data is not up-to-date
+    if (
+      not dataset_version.from_snapshot
+      and time_since_update.total_seconds() / 86400 > self.max_age_days
+    ):
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"{self.title} are not up-to-date",
+      )
+
+    return dataset_version.data
+
+  def add_update_listener(self, listener: Callable[[], Awaitable[None]]) -> None:
+    """
+    Registers a function that is awaited after every successful refresh of the dataset.
+    """
+    self.update_listeners.append(listener)
+
+  async def notify_update_listeners(self) -> None:
+    for listener in self.update_listeners:
+      try:
+        await listener()
+      except Exception as e:
+        print(f"Error in update listener of {self.title}. Error: {str(e)}")
+
+  async def handle_dependency_update(self) -> None:
+    """
+    Re-derives the dataset after one of its dependencies was updated, and passes the update on to
+    the datasets that depend on this one.
+    """
+    # Let a running refresh finish first, so the dataset is derived from its latest data
+    if self.is_updating():
+      await self.update()
+
+    if self.derive is None:
+      await self.update()
+    elif await self.derive():
+      await self.notify_update_listeners()
+
+  def publish(
+    self,
+    data: Any,
+    update_time: datetime,
+    from_snapshot: bool = False,
+    content_hash: str | None = None,
+  ) -> None:
+    """
+    Publishes the data of the dataset as a new cache version and marks it as updated.
+
+    Args:
+      content_hash (str | None, optional): The content hash of the inputs the data was built from
+                                           (None if unknown, so the next refresh publishes its data).
+    """
+    global current_cache_version
+
+    datasets: Dict[str, DatasetVersion] = dict(current_cache_version.datasets)
+    datasets[self.name] = DatasetVersion(
+      data=data, update_time=update_time, from_snapshot=from_snapshot,
+    )
+
+    # Swap in the new cache version (readers holding the previous version are not affected)
+    current_cache_version = CacheVersion(
+      version=current_cache_version.version + 1, datasets=MappingProxyType(datasets),
+    )
+
+    self.update_status.update_time = update_time
+    self.update_status.status = "Updated"
+    self.update_status.from_snapshot = from_snapshot
+    self.update_status.checked_time = None
+
+    self.content_hash = content_hash
+
+  def load_snapshot(self) -> None:
+    """
+    Loads the data of the dataset from its local snapshot (if one exists), so it can be used
+    before the first refresh finishes.
+    """
+    self.snapshot_signature = snapshots.get_snapshot_signature(name=self.name)
+    snapshot = snapshots.load_snapshot(name=self.name)
+    if snapshot is None:
+      return
+
+    self.publish(
+      data=self.get_snapshot_data(snapshot=snapshot), update_time=snapshot["update_time"],
+      from_snapshot=True,
+    )
+    self.update_status.status = snapshots.get_snapshot_status(
+      update_time=snapshot["update_time"], max_age_days=self.max_age_days,
+    )
+
+  def sync_snapshot(self) -> None:
+    """
+    Publishes the snapshot saved by the refresher process if it changed since it was last loaded
+    (used by workers that do not refresh the cached data themselves).
+    """
+    snapshot_signature = snapshots.get_snapshot_signature(name=self.name)
+
+    if snapshot_signature is not None and snapshot_signature != self.snapshot_signature:
+      self.snapshot_signature = snapshot_signature
+      snapshot = snapshots.load_snapshot(name=self.name)
+      if snapshot is not None:
+        self.publish(
+          data=self.get_snapshot_data(snapshot=snapshot), update_time=snapshot["update_time"],
+        )
+
+    # Pick up the refreshes of the refresher that found the data unchanged
+    checked_time = snapshots.load_checked_time(name=self.name)
+    if checked_time is not None and checked_time > self.update_status.update_time:
+      self.update_status.checked_time = checked_time
+
+  def get_snapshot_data(self, snapshot: Dict[str, Any]) -> Any:
+    """
+    Returns the data of a snapshot, with the changes made outside of refreshes applied (a snapshot
+    may have been saved before them).
+    """
+    if self.apply_changes is None:
+      return snapshot["data"]
+    return self.apply_changes(snapshot["data"])
+
+  async def save_snapshot(self) -> None:
+    """
+    Saves a local snapshot of the data of the dataset for fast restarts.
+    """
+    await run_in_threadpool(
+      snapshots.save_snapshot, name=self.name, data=self.data,
+      update_time=self.update_status.update_time,
+    )
+
+  def is_updating(self) -> bool:
+    return self.update_task is not None and not self.update_task.done()
+
+  def request_update(self) -> asyncio.Task[bool]:
+    """
+    Starts a refresh of the dataset, or returns the running refresh if one is already in progress
+    (so the dataset is never refreshed twice at the same time).
+    """
+    if not self.is_updating():
+      self.update_task = asyncio.create_task(self.run_update())
+    return self.update_task # type: ignore
+
+  async def update(self) -> bool:
+    """
+    Refreshes the dataset, or waits for the running refresh if one is already in progress.
+
+    Returns:
+      bool: True if the dataset was updated.
+    """
+    # Shield the shared refresh so cancelling one caller does not cancel it for the others
+    return await asyncio.shield(self.request_update())
+
+  def cancel_update(self) -> None:
+    if self.is_updating():
+      self.update_task.cancel() # type: ignore
+
+  async def run_update(self) -> bool:
+    """
+    Loads the latest data of the dataset, retrying failed attempts with exponential backoff.
+    Sends an error email if all attempts failed.
+
+    Returns:
+      bool: True if the dataset was updated (False if it failed or did not change).
+    """
+    # Refreshes run in their own task, and always read the latest data of their dependencies
+    pinned_cache_version.set(None)
+
+    # Collect the metrics of this refresh (Google API calls and phases are recorded by the
+    # functions that run them)
+    refresh_metrics = RefreshMetrics(
+      refresh_count=self.metrics.refresh_count + 1, failure_count=self.metrics.failure_count,
+    )
+    metrics.current_refresh_metrics.set(refresh_metrics)
+    start_time = time.perf_counter()
+
+    self.update_status.status = "Updating..."
+    attempt: int = 0
+
+    while attempt < self.retries:
+      try:
+        print(f"Updating {self.title}...")
+
+        inputs = await self.load()
+        content_hash = await run_in_threadpool(get_content_hash, self.get_content(inputs))
+
+        # Keep the published data if its inputs did not change (without building it again, and
+        # the data derived from it stays valid)
+        if content_hash == self.content_hash:
+          refresh_metrics.duration_seconds = time.perf_counter() - start_time
+          refresh_metrics.row_count = self.count_rows(self.data)
+          refresh_metrics.memory_bytes = metrics.get_memory_footprint(self.data)
+          self.metrics = refresh_metrics
+
+          print(f"{self.title} did not change.")
+          checked_time = datetime.now()
+          self.update_status.status = "Updated"
+          self.update_status.checked_time = checked_time
+          await run_in_threadpool(
+            snapshots.save_checked_time, name=self.name, checked_time=checked_time,
+          )
+          return False
+
+        data = inputs if self.build is None else self.build(inputs)
+
+        refresh_metrics.duration_seconds = time.perf_counter() - start_time
+        refresh_metrics.row_count = self.count_rows(data)
+        refresh_metrics.memory_bytes = metrics.get_memory_footprint(data)
+        self.metrics = refresh_metrics
+
+        self.publish(data=data, update_time=datetime.now(), content_hash=content_hash)
+        print(f"{self.title} finished updating.")
+
+        await self.save_snapshot()
+        await self.notify_update_listeners()
+
+        return True
+
+      except Exception as e:
+        attempt += 1
+        if attempt == self.retries:
+          print(f"Could not update {self.title}. Error: {str(e)}. Will send error email.")
+          self.update_status.status = "Error while updating"
+
+          refresh_metrics.failure_count += 1
+          refresh_metrics.duration_seconds = time.perf_counter() - start_time
+          self.metrics = refresh_metrics
+
+          # Send an error email if the dataset did not update
+          await send_error_email(
+            subject=f"PO Tool {self.title} Update Error",
+            error_message=str(e),
+          )
+        else:
+          wait_time = self.retry_wait * 2 ** (attempt - 1) # Exponential backoff
+          print(
+            f"There was an error while updating {self.title} (attempt: {attempt})." +
+            f" Retrying in {wait_time} seconds..."
+          )
+          await asyncio.sleep(wait_time)
+
+    return False
+
+def get_content_hash(data: Any) -> str:
+  """
+  Returns a hash of the content of the fetched inputs of a cached dataset (the pickled inputs, with
+  the array buffers hashed in place instead of being copied into the pickle).
+  """
+  content_hash = hashlib.blake2b(digest_size=16)
+  buffers: List[pickle.PickleBuffer] = []
+
+  content_hash.update(pickle.dumps(data, protocol=5, buffer_callback=buffers.append))
+  for buffer in buffers:
+    content_hash.update(buffer.raw())
+
+  return content_hash.hexdigest()
@@ -1,97 +1,33 @@
-from fastapi import HTTPException, status
 from typing import Dict
-from datetime import datetime
-import asyncio
 
-from api.services.google_api import sheets_utils
-from api.services.utils.send_emails import send_error_email
-from api.models.cache import UpdateStatus
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.services.cached_data import sku_po_tool
 from api.models.sheets import ItemTypeAcronymsProperties
 
-item_type_acronyms: Dict[str, Dict[str, str]] = {"item_type_acronyms": {}}
-
-item_type_acronyms_update_status = UpdateStatus(
-  update_time=datetime(year=1899, month=1, day=1),
-  status="Pending Initial Update",
-)
-
-def get_updated_item_type_acronyms() -> Dict[str, str]:
-  """
-  This function retrieves the global item_type_acronyms variable and validates its data
-  """
-  # Check how long it has been since the last Item Type Acronyms update
-  current_time = datetime.now()
-  time_since_update = current_time - item_type_acronyms_update_status.update_time
-
-  # Raise error if item type acronyms dict is empty
-  if not item_type_acronyms["item_type_acronyms"]:
-    raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="Could not find Item Type Acronyms.",
-    )
-  
-  # Raise error if item type acronyms are not up-to-date
-  if time_since_update.total_seconds() / 86400 > 1.05:
-    raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="Item Type Acronyms are not up-to-date",
-    )
-  
-  return item_type_acronyms["item_type_acronyms"]
-
-def get_item_type_acronyms_update_status() -> UpdateStatus:
-  return item_type_acronyms_update_status
-
-async def update_item_type_acronyms(repeat: bool, retries: int = 5):
+async def load_item_type_acronyms() -> Dict[str, str]:
   """
-  This function will be called on application startup to update the Item Type Acronyms
-  once a day. (Can be called manually as well)
+  This function retrieves the Item Type Acronyms rows of the cached SKU/PO Tool spreadsheet
+  and compiles them into an item-type-to-acronym dict.
   """
-  item_type_acronyms_update_status.status = "Updating..."
-  
-  while True:
-    attempt: int = 0
-
-    while attempt < retries:
-      try:
-        print("Updating Item Type Acronyms...")
-
-        # Retrieve the Item Type Acronyms rows from the SKU/PO Tool  spreadsheet
-        item_type_acronyms_sheet_values = await sheets_utils.get_row_dicts_from_spreadsheet(
-          ss_properties=ItemTypeAcronymsProperties()
-        )
-
-        item_type_acronyms_dict: Dict[str, str] = {}
+  item_type_acronyms_rows = sku_po_tool.get_updated_sku_po_tool_rows(
+    ss_properties=ItemTypeAcronymsProperties()
+  )
 
-        for row in item_type_acronyms_sheet_values.row_dicts:
-          item_type_acronyms_dict[row["ProductTypeName"]] = row["SKU Acronym"]
+  item_type_acronyms_dict: Dict[str, str] = {}
 
-        # Update the Item Type Acronyms global variables
-        item_type_acronyms["item_type_acronyms"] = item_type_acronyms_dict
-        item_type_acronyms_update_status.update_time = datetime.now()
-        item_type_acronyms_update_status.status = "Updated"
-        print("Item Type Acronyms finished updating.")
+  for row in item_type_acronyms_rows:
+    item_type_acronyms_dict[row["ProductTypeName"]] = row["SKU Acronym"]
 
-        break
+  return item_type_acronyms_dict
 
-      except Exception as e:
-        attempt += 1
-        if attempt == retries:
-          print(f"Could not update Item Type Acronyms. Error: {str(e)}. Will send error email.")
-          item_type_acronyms_update_status.status = "Error while updating"
-          # Send an error email if Item Type Acronyms did not update
-          await send_error_email(
-            subject="PO Tool Item Type Acronyms Update Error",
-            error_message=str(e),
-          )
-        else:
-          print(f"There was an error while updating Item Type Acronyms (attempt: {attempt}). Retrying in 5 seconds...")
-          await asyncio.sleep(5)
-          continue
+item_type_acronyms_dataset = CachedDataset(
+  name="item_type_acronyms", title="Item Type Acronyms",
+  load=load_item_type_acronyms, empty_data={},
+  dependencies=[sku_po_tool.sku_po_tool_dataset],
+)
 
-    if repeat:
-      # Repeat once a day
-      print("Item Type Acronyms update will run again in one day.")
-      await asyncio.sleep(86400)
-    else:
-      break
\ No newline at end of file
+def get_updated_item_type_acronyms() -> Dict[str, str]:
+  """
+  This function retrieves the cached Item Type Acronyms and validates their data
+  """
+  return item_type_acronyms_dataset.get_updated_data()
@@ -1,102 +1,91 @@
-from fastapi import HTTPException, status
-from typing import Dict, Any
-from datetime import datetime
-import asyncio
+from typing import Any, Dict, Iterable, List
+import numpy as np
+import pandas as pd
+from pandas import Series
 
 from api.services.google_api import sheets_utils
-from api.services.utils.send_emails import send_error_email
-from api.models.cache import UpdateStatus
+from api.services.cached_data.cached_dataset import CachedDataset
 from api.models.sheets import ListPricesProperties
 
-skus_to_list_prices: Dict[str, Dict[str, Any]] = {"skus": {}}
+class ListPrices:
+  """
+  A compact SKU-to-list-price store for the whole catalog.
 
-list_price_update_status = UpdateStatus(
-  update_time=datetime(year=1899, month=1, day=1),
-  status="Pending Initial Update",
-)
+  The SKUs are stored as sorted 64-bit hashes next to their list prices (parsed to floats once,
+  when the list prices are loaded), so millions of SKUs take 16 bytes each instead of a Python
+  string and value per SKU, and whole columns of SKUs are looked up at once with a binary search.
 
-def get_updated_skus_to_list_prices() -> Dict[str, str]:
+  Args:
+    skus (Iterable[Any]): The SKUs (compared as strings).
+    prices (Iterable[Any]): The list price of each SKU. Values that are not numbers are stored as
+                           NaN. If a SKU is listed more than once, its last price is kept.
+  """
+  def __init__(self, skus: Iterable[Any], prices: Iterable[Any]) -> None:
+    list_prices = pd.DataFrame({
+      "sku_hash": hash_skus(skus=list(skus)),
+      "price": pd.to_numeric(Series(list(prices), dtype=object), errors="coerce").astype(np.float64),
+    })
+    list_prices = list_prices.drop_duplicates(subset="sku_hash", keep="last").sort_values("sku_hash")
+
+    self.sku_hashes: np.ndarray = list_prices["sku_hash"].to_numpy(dtype=np.uint64)
+    self.prices: np.ndarray = list_prices["price"].to_numpy(dtype=np.float64)
+
+  def __len__(self) -> int:
+    return len(self.sku_hashes)
+
+  def get_list_prices(self, skus: Series) -> Series:
+    """
+    Looks up the list prices of a column of SKUs (NaN for SKUs without a list price).
+    For categorical columns only the distinct SKUs (the categories) are looked up.
+    """
+    if isinstance(skus.dtype, pd.CategoricalDtype):
+      category_prices = np.append(self.lookup(skus=skus.cat.categories), np.nan)
+      # Missing values have the code -1, which takes the appended NaN
+      return Series(category_prices[skus.cat.codes.to_numpy()], index=skus.index)
+
+    return Series(self.lookup(skus=skus), index=skus.index)
+
+  def lookup(self, skus: Iterable[Any]) -> np.ndarray:
+    sku_hashes = hash_skus(skus=list(skus))
+    if not len(self.sku_hashes):
+      return np.full(len(sku_hashes), np.nan)
+
+    # Find the position of each hash in the sorted hashes (missing hashes are compared with the
+    # hash at the position they would be inserted at, or the last hash)
+    positions = np.minimum(np.searchsorted(self.sku_hashes, sku_hashes), len(self.sku_hashes) - 1)
+    return np.where(self.sku_hashes[positions] == sku_hashes, self.prices[positions], np.nan)
+
+def hash_skus(skus: List[Any]) -> np.ndarray:
+  return pd.util.hash_array(np.array([str(sku) for sku in skus], dtype=object))
+
+async def load_list_prices() -> List[Dict[str, Any]]:
   """
-  This function retrieves the global marketplaces variable and validates its data
+  This function retrieves the List Price rows from the List Prices spreadsheet.
   """
-  # Check how long it has been since the last marketplace update
-  current_time = datetime.now()
-  time_since_update = current_time - list_price_update_status.update_time
-
-  # Raise error if sales reports list is empty
-  if not skus_to_list_prices["skus"]:
-    raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="Could not find list prices.",
-    )
-  
-  # Raise error if sales reports are not up-to-date
-  if time_since_update.total_seconds() / 86400 > 1.05:
-    raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="List Prices are not up-to-date",
-    )
-  
-  return skus_to_list_prices["skus"]
-
-def get_list_price_update_status() -> UpdateStatus:
-  return list_price_update_status
-
-async def update_list_prices(repeat: bool, retries: int = 5):
+  list_price_sheet_values = await sheets_utils.get_row_dicts_from_spreadsheet(
+    ss_properties=ListPricesProperties()
+  )
+
+  return list_price_sheet_values.row_dicts
+
+def build_list_prices(list_price_rows: List[Dict[str, Any]]) -> ListPrices:
+  """
+  This function compiles the List Price rows into a compact SKU-to-list-price store (only when the
+  rows changed since the last refresh).
+  """
+  return ListPrices(
+    skus=(list_price_row["ProductID"] for list_price_row in list_price_rows),
+    prices=(list_price_row["ListPrice"] for list_price_row in list_price_rows),
+  )
+
+list_prices_dataset = CachedDataset(
+  name="list_prices", title="List Prices", load=load_list_prices,
+  empty_data=ListPrices(skus=[], prices=[]),
+  build=lambda list_price_rows: build_list_prices(list_price_rows=list_price_rows),
+)
+
+def get_updated_list_prices() -> ListPrices:
   """
-  This function will be called on application startup to update the List Prices
-  once a day. (Can be called manually as well)
+  This function retrieves the cached List Prices and validates their data
   """
-  list_price_update_status.status = "Updating..."
-
-  while True:
-    attempt: int = 0
-
-    while attempt < retries:
-      try:
-        print("Updating List Prices...")
-
-        # Retrieve the List Price data from the List Prices spreadsheet
-        list_price_sheet_values = await sheets_utils.get_row_dicts_from_spreadsheet(
-          ss_properties=ListPricesProperties()
-        )
-
-        list_price_row_dicts = list_price_sheet_values.row_dicts
-
-        # Compile list price sheet values into sku-to-list-price dict
-        new_sku_to_list_price: Dict[str, str] = {}
-
-        for list_price_row in list_price_row_dicts:
-          sku: str = list_price_row["ProductID"]
-          list_price: Any = list_price_row["ListPrice"]
-          new_sku_to_list_price[sku] = list_price
-
-        # Update the list price global variables
-        skus_to_list_prices["skus"] = new_sku_to_list_price
-        list_price_update_status.update_time = datetime.now()
-        list_price_update_status.status = "Updated"
-        print("List Prices finished updating.")
-
-        break
-
-      except Exception as e:
-        attempt += 1
-        if attempt == retries:
-          print(f"Could not update List Prices. Error: {str(e)}. Will send error email.")
-          list_price_update_status.status = "Error while updating"
-          # Send an error email if sales report did not update
-          await send_error_email(
-            subject="PO Tool List Prices Update Error",
-            error_message=str(e),
-          )
-        else:
-          print(f"There was an error while updating List Prices (attempt: {attempt}). Retrying in 5 seconds...")
-          await asyncio.sleep(5)
-          continue
-
-    if repeat:
-      # Repeat once a day
-      print("List Prices update will run again in one day.")
-      await asyncio.sleep(86400)
-    else:
-      break
\ No newline at end of file
+  return list_prices_dataset.get_updated_data()
@@ -2,176 +2,389 @@ from typing import List, Dict, Any
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
+import pandas as pd
+from pandas import DataFrame
 import asyncio
 
 from api.services.google_api import drive as drive_services
 from api.services.google_api import sheets_utils
-from api.services.utils.send_emails import send_error_email
-from api.models.sheets import RowDicts, SalesReportProperties
-from api.models.cache import UpdateStatus
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.services.utils.refresh_metrics import measure_phase
+from api.models.sheets import SalesReportProperties
 from api.services.cached_data import list_prices
 from api.services.cached_data import marketplaces
 from api.crud.settings import get_breakdown_net_sales_settings
 
-# Global variables for sales reports
-sales_reports_rows: Dict[str, RowDicts] = { "row_dicts": RowDicts(row_dicts=[]) }
+# Type of the pre-aggregated sales totals: {brand gender category: {marketplace group: totals}}
+SalesCube = Dict[str, Dict[str, Dict[str, float]]]
 
-sales_reports_update_status = UpdateStatus(
-  update_time=datetime(year=1899, month=1, day=1),
-  status="Pending Initial Update",
-)
+# Columns with repeated values that are stored as pandas categoricals (each distinct value is
+# stored once, and every sales row only stores a small integer code)
+categorical_columns: List[str] = [
+  "Trans Type", "Marketplace", "SKU", "Brand", "ProductName", "ProductTypeName", "Type", "Gender",
+  "Vendor", "Sales Rep",
+]
 
-def get_updated_sales_reports_rows() -> RowDicts:
+async def load_sales_reports(max_concurrent_downloads: int = 4) -> Dict[str, Any]:
   """
-  This function retrieves the global sales reports variable and validates its data
+  This function retrieves the latest sales reports. Only sales report files that were modified
+  since the last update are downloaded again, with at most max_concurrent_downloads files
+  downloading at the same time (Sheets quota).
   """
-  # Check how long it has been since the last sales reports update
-  current_time = datetime.now()
-  time_since_update = current_time - sales_reports_update_status.update_time
+  sales_reports_root_folder_id: str = "1YVeKul5kUUb4hr-bI8M20h2D94JM2W5w"
 
-  # Raise error if sales reports list is empty
-  if not sales_reports_rows["row_dicts"].row_dicts:
-    raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="Could not find sales reports",
+  current_settings = get_breakdown_net_sales_settings()
+  months_span = current_settings.sales_history_months
+
+  # Copy the downloaded files so the current sales reports are not changed while downloading
+  previous_data = sales_reports_dataset.data
+  report_file_cache: Dict[str, Dict[str, Any]] = dict(previous_data["sales_report_files"])
+
+  # Retrieve the latest files based on months_span
+  report_files = await get_sales_report_files(
+    root_folder_id=sales_reports_root_folder_id,
+    months_span=months_span,
+  )
+
+  # Download the sales rows of new or modified files
+  has_changes = await download_sales_report_files(
+    report_files=report_files, report_file_cache=report_file_cache,
+    max_concurrent_downloads=max_concurrent_downloads,
+  )
+
+  if (
+    not has_changes
+    and previous_data["months_span"] == months_span
+    and not previous_data["sales_reports"].empty
+  ):
+    print("Sales report files have not changed since the last update.")
+    return previous_data
+
+  # Keep the downloaded files in the order of the report files
+  report_file_cache = {
+    report_file["id"]: report_file_cache[report_file["id"]] for report_file in report_files
+  }
+
+  # Merge the sales rows of the files and join them with the latest list prices and marketplace groups
+  return build_sales_reports_data(sales_report_files=report_file_cache, months_span=months_span)
+
+def build_sales_reports_data(
+  sales_report_files: Dict[str, Dict[str, Any]], months_span: int,
+) -> Dict[str, Any]:
+  """
+  This function merges the downloaded sales rows of the files, joins them with the latest list
+  prices and marketplace groups, and builds the sales reports DataFrame and the pre-aggregated
+  sales cube.
+
+  Only the downloaded files and the data built from them are kept (the merged sales rows before
+  the join are not), so the sales history is held in memory (and in the snapshot) once by the
+  files and once by the joined sales rows.
+
+  Returns:
+    Dict[str, Any]: The sales reports data with the downloaded files ("sales_report_files"), the
+                    months span of the sales rows ("months_span"), the joined sales rows
+                    ("sales_reports"), and the sales totals ("sales_cube").
+  """
+  # Retrieve the relevant sales rows from the downloaded files
+  with measure_phase("parse"):
+    raw_sales_reports = get_sales_reports_rows(
+      report_file_cache=sales_report_files, months_span=months_span,
     )
-  
-  # Raise error if sales reports are not up-to-date
-  if time_since_update.total_seconds() / 86400 > 1.05:
+
+  # Retrieve the latest list prices
+  sku_list_prices = list_prices.get_updated_list_prices()
+
+  # Retrieve the latest marketplace group data
+  marketplace_to_groups = marketplaces.get_updated_marketplaces_to_groups()
+
+  with measure_phase("join"):
+    # Add list price data to sales rows
+    sales_reports = create_sales_reports_frame(
+      raw_sales_reports=raw_sales_reports,
+      sku_list_prices=sku_list_prices,
+      marketplace_to_groups=marketplace_to_groups,
+    )
+
+    # Sum sales and msrp for each brand-gender-type and marketplace group
+    sales_cube = create_sales_cube(
+      sales_reports=sales_reports, marketplace_to_groups=marketplace_to_groups,
+    )
+
+  return {
+    "sales_report_files": sales_report_files,
+    "months_span": months_span,
+    "sales_reports": sales_reports,
+    "sales_cube": sales_cube,
+  }
+
+async def rebuild_sales_reports() -> bool:
+  """
+  This function is called after the list prices or marketplaces are updated, and re-joins the
+  already downloaded sales rows with the new data (without downloading the sales reports again).
+  Returns True if the sales reports were rebuilt.
+  """
+  previous_data = sales_reports_dataset.data
+  if not previous_data["sales_report_files"]:
+    return False
+
+  try:
+    print("Rebuilding the sales reports...")
+    sales_reports_data = build_sales_reports_data(
+      sales_report_files=previous_data["sales_report_files"],
+      months_span=previous_data["months_span"],
+    )
+
+    sales_reports_dataset.publish(
+      data=sales_reports_data,
+      update_time=sales_reports_dataset.update_status.update_time,
+      from_snapshot=sales_reports_dataset.update_status.from_snapshot,
+      # The sales reports were rebuilt from the same files
+      content_hash=sales_reports_dataset.content_hash,
+    )
+    print("Sales reports finished rebuilding.")
+
+    await sales_reports_dataset.save_snapshot()
+    return True
+
+  except Exception as e:
+    print(f"Could not rebuild sales reports. Error: {str(e)}")
+    return False
+
+sales_reports_dataset = CachedDataset(
+  name="sales_reports",
+  title="Sales Reports",
+  load=load_sales_reports,
+  empty_data={
+    "sales_report_files": {},
+    "months_span": 0,
+    "sales_reports": DataFrame(),
+    "sales_cube": {},
+  },
+  is_empty=lambda data: data["sales_reports"].empty,
+  count_rows=lambda data: len(data["sales_reports"]),
+  refresh_interval=3600, # Unchanged files are not downloaded again
+  # The sales rows are joined with the list prices and marketplace groups, and are re-joined
+  # whenever one of them is updated
+  dependencies=[list_prices.list_prices_dataset, marketplaces.marketplaces_dataset],
+  derive=rebuild_sales_reports,
+  get_content=lambda data: get_sales_report_versions(sales_reports_data=data),
+)
+
+def get_sales_report_versions(sales_reports_data: Dict[str, Any]) -> Dict[str, Any]:
+  """
+  This function returns the Drive versions (modified time and version) of the sales report files
+  and the months span the sales reports were built from. Refreshes compare these instead of the
+  sales rows, since the sales reports only change when the files or the months span change.
+  """
+  return {
+    "months_span": sales_reports_data["months_span"],
+    "files": {
+      file_id: (report_file["modified_time"], report_file["version"])
+      for file_id, report_file in sales_reports_data["sales_report_files"].items()
+    },
+  }
+
+def get_updated_sales_reports_rows() -> DataFrame:
+  """
+  This function retrieves the cached sales reports and validates their data.
+  The sales rows are returned as a DataFrame so they can be filtered and aggregated column-wise.
+  """
+  return sales_reports_dataset.get_updated_data()["sales_reports"]
+
+def get_updated_sales_cube() -> SalesCube:
+  """
+  This function retrieves the pre-aggregated sales totals (total sales and total MSRP) for each
+  Brand Gender Category and marketplace group, and validates that the sales reports are up-to-date.
+  """
+  return sales_reports_dataset.get_updated_data()["sales_cube"]
+
+def create_sales_reports_frame(
+  raw_sales_reports: DataFrame,
+  sku_list_prices: list_prices.ListPrices,
+  marketplace_to_groups: Dict[str, str],
+) -> DataFrame:
+  """
+  This function removes sales rows without a list price, order date or marketplace,
+  and adds the "Brand Gender Category" and "MSRP" columns.
+  """
+  sales_df = raw_sales_reports
+
+  # Look up the list prices of all sales rows at once (missing or invalid prices count as zero)
+  row_list_prices = sku_list_prices.get_list_prices(skus=sales_df["SKU"]).fillna(0.0)
+
+  # Keep only rows that have a list price, an order date and a marketplace
+  has_data = (
+    (row_list_prices != 0) & sales_df["Order Date"].astype(bool) & sales_df["Marketplace"].astype(bool)
+  )
+  sales_df = sales_df[has_data].reset_index(drop=True)
+  row_list_prices = row_list_prices[has_data].reset_index(drop=True)
+
+  # Raise error if a marketplace is missing from the marketplace groups
+  unknown_marketplaces = sales_df.loc[~sales_df["Marketplace"].isin(marketplace_to_groups), "Marketplace"]
+  if not unknown_marketplaces.empty:
     raise HTTPException(
-      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-      detail="Sales reports are not up-to-date",
+      status_code=status.HTTP_404_NOT_FOUND,
+      detail=f"Could not find '{unknown_marketplaces.iloc[0]}' in marketplace groups.",
     )
-  
-  return sales_reports_rows["row_dicts"]
 
-def get_sales_reports_update_status() -> UpdateStatus:
-  return sales_reports_update_status
+  sales_df["Brand Gender Category"] = (
+    sales_df["Brand"].astype(str).str.lower() + " " +
+    sales_df["Gender"].astype(str) + " " + sales_df["Type"].astype(str)
+  )
+  sales_df["MSRP"] = sales_df["Qty"].astype(int) * row_list_prices
+  sales_df["Grand Total + Adjustmensts - Tax + Accrual Refunds"] = pd.to_numeric(
+    sales_df["Grand Total + Adjustmensts - Tax + Accrual Refunds"], errors="coerce",
+  ).fillna(0.0).astype(float)
+  sales_df["Brand Gender Category"] = sales_df["Brand Gender Category"].astype("category")
+
+  return compact_sales_rows(sales_rows=sales_df)
 
-async def update_sales_reports(repeat: bool, retries: int = 5):
+def compact_sales_rows(sales_rows: DataFrame) -> DataFrame:
   """
-  This function will be called on application startup to update the sales reports
-  once a day. (Can be called manually as well)
+  This function stores the columns with repeated values of the sales rows as categoricals.
+  All sales report columns are kept, since the Relevant Sales sheet is posted with all of them.
   """
-  sales_reports_root_folder_id: str = "1YVeKul5kUUb4hr-bI8M20h2D94JM2W5w"
-  sales_reports_update_status.status = "Updating..."
+  for column in categorical_columns:
+    if sales_rows[column].dtype != "category":
+      sales_rows[column] = sales_rows[column].astype("category")
 
-  current_settings = get_breakdown_net_sales_settings()
-  months_span = current_settings.sales_history_months
+  return sales_rows
 
-  while True:
-    attempt: int = 0
+def create_sales_cube(sales_reports: DataFrame, marketplace_to_groups: Dict[str, str]) -> SalesCube:
+  """
+  This function sums the sales and MSRP of the sales rows for each Brand Gender Category and
+  marketplace group, so breakdowns can look up totals instead of scanning all sales rows.
+  """
+  sales_totals = sales_reports.groupby(
+    [
+      sales_reports["Brand Gender Category"].astype(str),
+      sales_reports["Marketplace"].astype(str).map(marketplace_to_groups),
+    ],
+  )[["Grand Total + Adjustmensts - Tax + Accrual Refunds", "MSRP"]].sum()
+
+  sales_cube: SalesCube = {}
+
+  for (brand_gender_type, marketplace), totals in sales_totals.iterrows():
+    if brand_gender_type not in sales_cube:
+      sales_cube[brand_gender_type] = {}
+    sales_cube[brand_gender_type][marketplace] = {
+      "total_sales": float(totals["Grand Total + Adjustmensts - Tax + Accrual Refunds"]),
+      "total_msrp": float(totals["MSRP"]),
+    }
+
+  return sales_cube
+
+async def download_sales_report_files(
+  report_files: List[Dict[str, str]],
+  report_file_cache: Dict[str, Dict[str, Any]],
+  max_concurrent_downloads: int = 4,
+  chunk_size: int = 10000,
+) -> bool:
+  """
+  This function downloads the sales rows of the given sales report files that are new or were
+  modified since they were last downloaded, and removes files that are no longer relevant from
+  the file cache (keyed by Drive file id). Files are downloaded concurrently (at most
+  max_concurrent_downloads at a time). Each file is read in chunks of chunk_size rows, and rows
+  without an order date or marketplace are dropped from each chunk before it is kept.
+  Returns True if any files were downloaded or removed.
+  """
+  report_file_ids = set(report_file["id"] for report_file in report_files)
+
+  # Remove files that are no longer in the months span
+  removed_file_ids = [file_id for file_id in report_file_cache if file_id not in report_file_ids]
+  for file_id in removed_file_ids:
+    del report_file_cache[file_id]
+
+  # Find files that were not downloaded yet or were modified since they were downloaded
+  changed_files = [
+    report_file for report_file in report_files
+    if report_file["id"] not in report_file_cache
+    or report_file_cache[report_file["id"]]["modified_time"] != report_file["modified_time"]
+    or report_file_cache[report_file["id"]]["version"] != report_file["version"]
+  ]
 
-    while attempt < retries:
-      try:
-        print("Updating the sales reports...")
+  print(f"Downloading {len(changed_files)} new or modified sales report files...")
 
-        # Retrieve the latest file ids based on months_span
-        file_ids = await get_sales_report_file_ids(
-          root_folder_id=sales_reports_root_folder_id,
-          months_span=months_span,
-        )
+  download_limit = asyncio.Semaphore(max_concurrent_downloads)
 
-        # Retrieve the relevant sales rows from the file ids
-        sales_rows = await get_sales_reports_rows(
-          file_ids=file_ids, months_span=months_span
+  async def download_sales_report_file(report_file: Dict[str, str]) -> None:
+    ss_properties = SalesReportProperties(id=report_file["id"])
+
+    async with download_limit:
+      # Retrieve the sales rows of the current sheet chunk by chunk, keeping only rows with data
+      sales_row_chunks = [
+        filter_sales_rows(sales_rows=sales_rows)
+        async for sales_rows in sheets_utils.get_row_frames_from_spreadsheet(
+          ss_properties=ss_properties, chunk_size=chunk_size,
         )
+      ]
+
+    # Add sales row data to the file cache
+    report_file_cache[report_file["id"]] = {
+      "modified_time": report_file["modified_time"],
+      "version": report_file["version"],
+      "sales_rows": compact_sales_rows(
+        sales_rows=pd.concat(sales_row_chunks, ignore_index=True),
+      ),
+    }
 
-        # Retrieve the latest list prices
-        sku_to_list_price = list_prices.get_updated_skus_to_list_prices()
-
-        # Retrieve the latest marketplace group data
-        marketplace_to_groups = marketplaces.get_updated_marketplaces_to_groups()
-
-        final_sales_rows: List[Dict[str, Any]] = []
-
-        # Add list price data to sales rows
-        for row in sales_rows.row_dicts:
-          list_price = float(sku_to_list_price.get(row["SKU"], 0.0))
-          if not list_price or not row["Order Date"] or not row["Marketplace"]:
-            continue
-          if not row["Marketplace"] in marketplace_to_groups:
-            raise HTTPException(
-              status_code=status.HTTP_404_NOT_FOUND,
-              detail=f"Could not find '{row["Marketplace"]}' in marketplace groups.",
-            )
-
-          row["Brand Gender Category"] = f"{str(row['Brand']).lower()} {row['Gender']} {row['Type']}"
-          row["MSRP"] = int(row["Qty"]) * list_price
-
-          final_sales_rows.append(row)
-
-        # Update the sales reports global variables
-        sales_reports_rows["row_dicts"] = RowDicts(row_dicts=final_sales_rows)
-        sales_reports_update_status.update_time = datetime.now()
-        sales_reports_update_status.status = "Updated"
-        print("Sales reports finished updating.")
-
-        break
-
-      except Exception as e:
-        attempt += 1
-        if attempt == retries:
-          print(f"Could not update sales reports. Error: {str(e)}. Will send error email.")
-          sales_reports_update_status.status = "Error while updating"
-          # Send an error email if sales report did not update
-          await send_error_email(
-            subject="PO Tool Sales Report Update Error",
-            error_message=str(e),
-          )
-        else:
-          print(f"There was an error while updating Sales Reports (attempt: {attempt}). Retrying in 5 seconds...")
-          await asyncio.sleep(5)
-          continue
-
-    if repeat:
-      # Repeat once a day
-      print("Sales Reports update will run again in one day.")
-      await asyncio.sleep(86400)
-    else:
-      break
-
-async def get_sales_reports_rows(file_ids: List[str], months_span: int) -> RowDicts:
+  await asyncio.gather(*[download_sales_report_file(report_file) for report_file in changed_files])
+
+  return bool(changed_files or removed_file_ids)
+
+def filter_sales_rows(sales_rows: DataFrame) -> DataFrame:
   """
-  This function retrieves all sales reports rows from the given file ids and filters out
+  This function removes sales rows without an order date or marketplace. Rows outside of the
+  months span are removed when the files are merged, since the span depends on the latest order
+  date of all files.
+  """
+  order_dates = pd.to_numeric(sales_rows["Order Date"], errors="coerce")
+
+  return sales_rows[
+    sales_rows["Order Date"].astype(bool)
+    & order_dates.notna()
+    & sales_rows["Marketplace"].astype(bool)
+  ]
+
+def get_sales_reports_rows(
+  report_file_cache: Dict[str, Dict[str, Any]],
+  months_span: int,
+) -> DataFrame:
+  """
+  This function merges the downloaded sales rows of the files and filters out
   the latest rows that are included in the months_span
   """
-  all_sales_rows: List[Dict[str, Any]] = []
+  all_sales_rows = pd.concat(
+    [report_file["sales_rows"] for report_file in report_file_cache.values()],
+    ignore_index=True,
+  )
 
-  for file_id in file_ids:
-    # Retrieve sheet and sales row values for current sheet
-    sheet_values = await sheets_utils.get_row_dicts_from_spreadsheet(
-      ss_properties=SalesReportProperties(id=file_id)
-    )
-    sales_rows = sheet_values.row_dicts
+  # Convert order dates to their day numbers (empty order dates become NaN)
+  order_dates = pd.to_numeric(all_sales_rows["Order Date"], errors="coerce")
+  has_order_date = all_sales_rows["Order Date"].astype(bool) & order_dates.notna()
 
-    # Add sales row data to all_sales_rows
-    all_sales_rows.extend(sales_rows)
-  
   # Find start date of timespan
   base_date = datetime(1899, 12, 30).date()
-  order_dates = [
-    base_date + timedelta(days=sales_row["Order Date"])
-    for sales_row in all_sales_rows
-    if sales_row["Order Date"]
-  ]
-  latest_date = max(order_dates)
+  latest_date = base_date + timedelta(days=float(order_dates[has_order_date].max()))
   start_date = latest_date - relativedelta(months=months_span)
+  start_day_number = (start_date - base_date).days
 
   # Filter out irrelevant sales rows
-  relevant_sales_rows = [
-    sales_row for sales_row in all_sales_rows
-    if sales_row["Order Date"]
-    and (base_date + timedelta(days=sales_row["Order Date"]) >= start_date)
-    and sales_row["Marketplace"]
-  ]
+  relevant_sales_rows = all_sales_rows[
+    has_order_date
+    & (order_dates >= start_day_number)
+    & all_sales_rows["Marketplace"].astype(bool)
+  ].reset_index(drop=True)
 
   print("Retrieved all relevant sales rows from files.")
-  return RowDicts(row_dicts=relevant_sales_rows)
 
-async def get_sales_report_file_ids(root_folder_id: str, months_span: int) -> List[str]:
+  # The categoricals of the files have different categories, so they are merged as plain values
+  return compact_sales_rows(sales_rows=relevant_sales_rows)
+
+async def get_sales_report_files(root_folder_id: str, months_span: int) -> List[Dict[str, str]]:
   """
-  This function finds the IDs of the latest sales report spreadsheets based on the months span.
+  This function finds the latest sales report spreadsheets based on the months span, and returns
+  their file data (name, id, modified_time and version).
   """
   latest_months_file_data: List[Dict[str, str]] = []
 
@@ -230,7 +443,7 @@ async def get_sales_report_file_ids(root_folder_id: str, months_span: int) -> Li
     ]
 
   print(f"Retrieved latest month files: {' '.join(month['name'] for month in latest_months_file_data)}")
-  return [month_file["id"] for month_file in latest_months_file_data]
+  return latest_months_file_data
 
 def get_latest_folders(
   folder_contents: Dict[str, List[Dict[str, str]]]
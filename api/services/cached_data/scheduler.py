@@ -0,0 +1,204 @@
+from fastapi import HTTPException, status
+from typing import Dict, List
+import asyncio
+import os
+
+from api.services.cached_data import snapshots
+from api.services.utils import refresh_metrics as metrics
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.services.cached_data.list_prices import list_prices_dataset
+from api.services.cached_data.marketplaces import marketplaces_dataset
+from api.services.cached_data.item_types import item_types_dataset
+from api.services.cached_data.sales_reports import sales_reports_dataset
+from api.services.cached_data.brand_codes import brand_codes_dataset
+from api.services.cached_data.item_type_acronyms import item_type_acronyms_dataset
+from api.services.cached_data.valid_sizes import valid_sizes_dataset
+from api.services.cached_data.aliases import aliases_dataset
+from api.services.cached_data.sku_po_tool import sku_po_tool_dataset
+from api.models.cache import UpdateStatusOut
+
+class CacheScheduler:
+  """
+  Owns the refresh timing of all cached datasets.
+
+  On startup the scheduler loads the local snapshots of all datasets and starts a refresh loop
+  for each dataset. The refreshes run as a dependency graph: independent datasets refresh in
+  parallel, and a dataset only starts its first refresh after the first refresh of each of its
+  dependencies has finished. Later updates of a dependency re-derive its dependents through the
+  update listeners registered by CachedDataset.
+
+  When shared is True (the API runs with multiple workers), only the worker that holds the
+  refresher lock refreshes the datasets. The other workers map the snapshots saved by the
+  refresher and check for new snapshots every sync_interval seconds, and take over the refreshes
+  if the refresher stops.
+  """
+  def __init__(
+    self,
+    datasets: List[CachedDataset],
+    shared: bool = False,
+    sync_interval: int = 10,
+  ) -> None:
+    self.datasets: Dict[str, CachedDataset] = {dataset.name: dataset for dataset in datasets}
+    self.refresh_order: List[CachedDataset] = get_refresh_order(datasets=datasets)
+    self.initial_refreshes: Dict[str, asyncio.Event] = {}
+    self.refresh_tasks: List[asyncio.Task[None]] = []
+    self.shared = shared
+    self.sync_interval = sync_interval
+    self.is_refresher = True
+
+  def get_dataset(self, name: str) -> CachedDataset:
+    if name not in self.datasets:
+      raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Cached dataset '{name}' does not exist.",
+      )
+    return self.datasets[name]
+
+  def get_update_statuses(self) -> List[UpdateStatusOut]:
+    return [
+      UpdateStatusOut(
+        **dataset.update_status.model_dump(), name=dataset.name, metrics=dataset.metrics,
+      )
+      for dataset in self.datasets.values()
+    ]
+
+  def get_prometheus_metrics(self) -> str:
+    return metrics.format_prometheus_metrics(
+      metrics_by_dataset={name: dataset.metrics for name, dataset in self.datasets.items()},
+    )
+
+  def start(self) -> None:
+    """
+    Loads the local snapshots of all datasets and starts their refresh loops (or, for workers
+    that do not refresh the datasets, the loop that picks up the snapshots of the refresher).
+    """
+    for dataset in self.datasets.values():
+      dataset.load_snapshot()
+
+    if self.shared and not snapshots.acquire_refresher_lock():
+      print("Another worker refreshes the cached data. Will use its snapshots.")
+      self.is_refresher = False
+      self.refresh_tasks.append(asyncio.create_task(self.run_sync_loop()))
+      return
+
+    self.start_refreshing()
+
+  def start_refreshing(self) -> None:
+    self.is_refresher = True
+    self.initial_refreshes = {name: asyncio.Event() for name in self.datasets}
+
+    for dataset in self.refresh_order:
+      self.refresh_tasks.append(asyncio.create_task(self.run_refresh_loop(dataset=dataset)))
+
+    if self.shared:
+      self.refresh_tasks.append(asyncio.create_task(self.run_refresh_request_loop()))
+
+  def request_update(self, dataset: CachedDataset) -> None:
+    """
+    Starts a refresh of a dataset, or asks the refresher worker to refresh it.
+    """
+    if self.is_refresher:
+      dataset.request_update()
+    else:
+      snapshots.request_refresh(name=dataset.name)
+
+  async def stop(self) -> None:
+    """
+    Cancels the refresh loops and running refreshes of all datasets.
+    """
+    for task in self.refresh_tasks:
+      task.cancel()
+
+    for dataset in self.datasets.values():
+      dataset.cancel_update()
+
+    await asyncio.gather(*self.refresh_tasks, return_exceptions=True)
+    self.refresh_tasks = []
+
+  async def run_sync_loop(self) -> None:
+    while True:
+      await asyncio.sleep(self.sync_interval)
+
+      # Take over the refreshes if the refresher worker stopped
+      if snapshots.acquire_refresher_lock():
+        print("Taking over the cached data refreshes.")
+        self.start_refreshing()
+        return
+
+      for dataset in self.datasets.values():
+        dataset.sync_snapshot()
+
+  async def run_refresh_request_loop(self) -> None:
+    while True:
+      await asyncio.sleep(self.sync_interval)
+
+      for name in snapshots.pop_refresh_requests():
+        if name in self.datasets:
+          self.datasets[name].request_update()
+
+  async def run_refresh_loop(self, dataset: CachedDataset) -> None:
+    # Wait for the first refresh of the dependencies, so the dataset is not built from missing data
+    for dependency in dataset.dependencies:
+      await self.initial_refreshes[dependency.name].wait()
+
+    is_initial_refresh = True
+
+    while True:
+      await dataset.update()
+
+      if is_initial_refresh:
+        self.initial_refreshes[dataset.name].set()
+        is_initial_refresh = False
+
+      print(f"{dataset.title} update will run again in {dataset.refresh_interval} seconds.")
+      await asyncio.sleep(dataset.refresh_interval)
+
+def get_refresh_order(datasets: List[CachedDataset]) -> List[CachedDataset]:
+  """
+  Sorts the datasets so every dataset comes after its dependencies.
+
+  Raises:
+    ValueError: If a dependency is not scheduled or the dependencies contain a cycle.
+  """
+  names = {dataset.name for dataset in datasets}
+  refresh_order: List[CachedDataset] = []
+  remaining = list(datasets)
+
+  for dataset in datasets:
+    for dependency in dataset.dependencies:
+      if dependency.name not in names:
+        raise ValueError(f"{dataset.title} depends on {dependency.title}, which is not scheduled.")
+
+  while remaining:
+    ordered_names = {dataset.name for dataset in refresh_order}
+    ready = [
+      dataset for dataset in remaining
+      if all(dependency.name in ordered_names for dependency in dataset.dependencies)
+    ]
+
+    if not ready:
+      raise ValueError(
+        "Cached datasets have circular dependencies: " +
+        ", ".join(dataset.title for dataset in remaining)
+      )
+
+    refresh_order.extend(ready)
+    remaining = [dataset for dataset in remaining if dataset not in ready]
+
+  return refresh_order
+
+cache_scheduler = CacheScheduler(
+  datasets=[
+    list_prices_dataset,
+    marketplaces_dataset,
+    item_types_dataset,
+    sales_reports_dataset,
+    sku_po_tool_dataset,
+    brand_codes_dataset,
+    item_type_acronyms_dataset,
+    valid_sizes_dataset,
+    aliases_dataset,
+  ],
+  # Set when the API runs with multiple workers, so only one worker refreshes the cached data
+  shared=os.getenv("CACHE_SHARED_WORKERS") == "1",
+)
@@ -0,0 +1,62 @@
+from typing import Any, Dict, List
+import time
+
+from api.services.google_api import sheets_utils
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.models.sheets import (
+  SheetProperties, RowDicts, BrandCodesProperties, ItemTypeAcronymsProperties, ValidSizesProperties,
+  AliasesCreatedSkusProperties,
+)
+
+# The sheets of the SKU/PO Tool spreadsheet used by the cached datasets
+sku_po_tool_sheets: List[SheetProperties] = [
+  BrandCodesProperties(),
+  ItemTypeAcronymsProperties(),
+  ValidSizesProperties(),
+  AliasesCreatedSkusProperties(),
+]
+
+async def load_sku_po_tool_sheets() -> Dict[str, Any]:
+  """
+  This function retrieves the rows of all used sheets of the SKU/PO Tool spreadsheet with one
+  batchGet request. The datasets built from these sheets (brand codes, item type acronyms, valid
+  sizes, and aliases) depend on this dataset, and are rebuilt from its rows after every refresh.
+
+  Returns:
+    Dict[str, Any]: The rows of each sheet by sheet name ("sheets"), and the time the sheets were
+                    requested ("fetch_time").
+  """
+  fetch_time = time.time()
+
+  sheets_values = await sheets_utils.get_row_dicts_from_spreadsheet_sheets(
+    ss_properties_list=sku_po_tool_sheets,
+  )
+
+  return {
+    "fetch_time": fetch_time,
+    "sheets": {
+      ss_properties.sheet_name: RowDicts(row_dicts=sheet_values.row_dicts)
+      for ss_properties, sheet_values in zip(sku_po_tool_sheets, sheets_values)
+    },
+  }
+
+sku_po_tool_dataset = CachedDataset(
+  name="sku_po_tool", title="SKU/PO Tool Sheets", load=load_sku_po_tool_sheets,
+  empty_data={"fetch_time": 0.0, "sheets": {}},
+  is_empty=lambda data: not data["sheets"],
+  count_rows=lambda data: sum(len(rows.row_dicts) for rows in data["sheets"].values()),
+  # The aliases are refreshed hourly (newly created SKUs are added to them as they are created)
+  refresh_interval=3600,
+  # Compare only the rows between refreshes (the fetch time changes with every refresh)
+  get_content=lambda data: data["sheets"],
+)
+
+def get_updated_sku_po_tool_rows(ss_properties: SheetProperties) -> List[Dict[str, Any]]:
+  """
+  This function retrieves the cached rows of a sheet of the SKU/PO Tool spreadsheet and validates
+  their data
+  """
+  return sku_po_tool_dataset.get_updated_data()["sheets"][ss_properties.sheet_name].row_dicts
+
+def get_sku_po_tool_fetch_time() -> float:
+  return sku_po_tool_dataset.get_updated_data()["fetch_time"]
@@ -0,0 +1,290 @@
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import pickle
+import struct
+import fcntl
+import tempfile
+import mmap
+import os
+
+# Increase when the structure of the cached data changes, so older snapshots are ignored
+SNAPSHOT_VERSION: int = 8
+
+# Snapshot files start with this marker, followed by the length of the pickled data and the number
+# and lengths of the array buffers stored after it
+SNAPSHOT_MARKER: bytes = b"POCACHE\0"
+
+# Array buffers are aligned so the arrays mapped from the snapshot file are aligned as well
+BUFFER_ALIGNMENT: int = 64
+
+snapshots_folder = Path(os.getenv("CACHE_SNAPSHOTS_FOLDER", "cache_snapshots"))
+
+# The lock file held by the process that refreshes the cached data (see acquire_refresher_lock)
+refresher_lock_file: TextIO | None = None
+
+def save_snapshot(name: str, data: Any, update_time: datetime) -> None:
+  """
+  Write the data of a cached dataset to a local snapshot file.
+
+  The data is pickled with its NumPy/pandas array buffers stored out-of-band after the pickled
+  data, so load_snapshot can map the arrays straight from the file without copying them.
+  The snapshot is written to a temporary file first and then renamed over the previous
+  snapshot, so a crash while writing never leaves a partially written snapshot behind, and
+  processes that mapped the previous snapshot keep their version. Every save writes its own
+  temporary file, so saves running at the same time (in other threads or workers) never write
+  to the same file.
+  Errors are only printed, since a missing snapshot just means a slower restart.
+
+  Args:
+    name (str): The name of the cached dataset (used as the file name).
+    data (Any): The data of the cached dataset.
+    update_time (datetime): The time the data was last updated.
+  """
+  temp_path: str | None = None
+
+  try:
+    snapshots_folder.mkdir(parents=True, exist_ok=True)
+    snapshot_path = snapshots_folder / f"{name}.snapshot"
+
+    buffers: List[pickle.PickleBuffer] = []
+    pickled_data = pickle.dumps(
+      {"version": SNAPSHOT_VERSION, "update_time": update_time, "data": data},
+      protocol=5, buffer_callback=buffers.append,
+    )
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    header = SNAPSHOT_MARKER + struct.pack(
+      f"<QQ{len(raw_buffers)}Q", len(pickled_data), len(raw_buffers),
+      *[raw_buffer.nbytes for raw_buffer in raw_buffers],
+    )
+
+    with tempfile.NamedTemporaryFile(
+      dir=snapshots_folder, prefix=f"{name}.snapshot.", suffix=".tmp", delete=False,
+    ) as snapshot_file:
+      temp_path = snapshot_file.name
+      snapshot_file.write(header)
+      snapshot_file.write(pickled_data)
+
+      for raw_buffer in raw_buffers:
+        snapshot_file.write(b"\0" * get_padding(offset=snapshot_file.tell()))
+        snapshot_file.write(raw_buffer)
+
+    os.replace(temp_path, snapshot_path)
+    print(f"Saved {name} snapshot.")
+
+  except Exception as e:
+    print(f"Could not save {name} snapshot. Error: {str(e)}")
+
+    if temp_path is not None and os.path.exists(temp_path):
+      os.remove(temp_path)
+
+def load_snapshot(name: str) -> Dict[str, Any] | None:
+  """
+  Load the data of a cached dataset from its local snapshot file.
+
+  The snapshot file is memory-mapped read-only, and the arrays of the data use the mapped file
+  as their memory, so processes that load the same snapshot share those pages instead of each
+  holding a copy.
+
+  Args:
+    name (str): The name of the cached dataset.
+
+  Returns:
+    Dict[str, Any] | None: A dictionary with the snapshot "data" and its "update_time", or None
+                          if there is no snapshot or it was written by an older snapshot version.
+  """
+  snapshot_path = snapshots_folder / f"{name}.snapshot"
+
+  if not snapshot_path.exists():
+    return None
+
+  try:
+    with open(snapshot_path, "rb") as snapshot_file:
+      snapshot_map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    pickled_data, buffers = read_snapshot_sections(snapshot_view=memoryview(snapshot_map))
+
+    if pickled_data is None:
+      print(f"Ignoring {name} snapshot from an older version.")
+      return None
+
+    snapshot: Dict[str, Any] = pickle.loads(pickled_data, buffers=buffers)
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+      print(f"Ignoring {name} snapshot from an older version.")
+      return None
+
+    print(f"Loaded {name} snapshot.")
+    return snapshot
+
+  except Exception as e:
+    print(f"Could not load {name} snapshot. Error: {str(e)}")
+    return None
+
+def read_snapshot_sections(
+  snapshot_view: memoryview,
+) -> Tuple[memoryview | None, List[memoryview]]:
+  """
+  Splits a snapshot file into its pickled data and its array buffers (without copying them).
+  Returns None as the pickled data if the file is not in the current snapshot format.
+  """
+  if snapshot_view[:len(SNAPSHOT_MARKER)] != SNAPSHOT_MARKER:
+    return None, []
+
+  offset = len(SNAPSHOT_MARKER)
+  pickled_data_length, buffer_count = struct.unpack_from("<QQ", snapshot_view, offset)
+  offset += 16
+  buffer_lengths = struct.unpack_from(f"<{buffer_count}Q", snapshot_view, offset)
+  offset += 8 * buffer_count
+
+  pickled_data = snapshot_view[offset:offset + pickled_data_length]
+  offset += pickled_data_length
+
+  buffers: List[memoryview] = []
+  for buffer_length in buffer_lengths:
+    offset += get_padding(offset=offset)
+    buffers.append(snapshot_view[offset:offset + buffer_length])
+    offset += buffer_length
+
+  return pickled_data, buffers
+
+def get_padding(offset: int) -> int:
+  return -offset % BUFFER_ALIGNMENT
+
+def get_snapshot_signature(name: str) -> Tuple[int, int] | None:
+  """
+  Returns the inode and modification time of the snapshot file of a cached dataset (which change
+  every time a new snapshot is saved), or None if there is no snapshot.
+  """
+  try:
+    snapshot_stat = os.stat(snapshots_folder / f"{name}.snapshot")
+    return snapshot_stat.st_ino, snapshot_stat.st_mtime_ns
+  except FileNotFoundError:
+    return None
+
+def get_snapshot_status(update_time: datetime, max_age_days: float = 1.05) -> str:
+  """
+  Returns the update status for data loaded from a snapshot (flagged as stale if the snapshot is
+  older than the freshness window of the cached data).
+  """
+  time_since_update = datetime.now() - update_time
+  if time_since_update.total_seconds() / 86400 > max_age_days:
+    return "Loaded from snapshot (stale)"
+  return "Loaded from snapshot"
+
+def save_checked_time(name: str, checked_time: datetime) -> None:
+  """
+  Records the last time a refresh found the data of a cached dataset unchanged (no new snapshot
+  is saved in that case), so workers that use the snapshots know the data is still up-to-date.
+  """
+  try:
+    snapshots_folder.mkdir(parents=True, exist_ok=True)
+    (snapshots_folder / f"{name}.checked").write_text(checked_time.isoformat())
+  except Exception as e:
+    print(f"Could not save {name} checked time. Error: {str(e)}")
+
+def load_checked_time(name: str) -> datetime | None:
+  try:
+    return datetime.fromisoformat((snapshots_folder / f"{name}.checked").read_text())
+  except (FileNotFoundError, ValueError):
+    return None
+
+def acquire_refresher_lock() -> bool:
+  """
+  Tries to become the process that refreshes the cached data when the API runs with multiple
+  workers. The lock is held until the process exits, so another worker takes over if the
+  refresher stops.
+
+  Returns:
+    bool: True if this process holds the refresher lock.
+  """
+  global refresher_lock_file
+
+  if refresher_lock_file is not None:
+    return True
+
+  snapshots_folder.mkdir(parents=True, exist_ok=True)
+  lock_file = open(snapshots_folder / "refresher.lock", "w")
+
+  try:
+    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+  except OSError:
+    lock_file.close()
+    return False
+
+  refresher_lock_file = lock_file
+  return True
+
+@contextmanager
+def hold_shared_lock(name: str) -> Iterator[None]:
+  """
+  Holds an exclusive lock on a lock file in the snapshots folder, so a change of state shared by
+  all workers (see save_shared_state) is made by one worker (or thread) at a time.
+  """
+  snapshots_folder.mkdir(parents=True, exist_ok=True)
+
+  with open(snapshots_folder / f"{name}.lock", "w") as lock_file:
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def save_shared_state(name: str, state: Any) -> None:
+  """
+  Saves state shared by all workers (e.g. changes of the cached data made outside of refreshes).
+  Like snapshots, the state is written to a temporary file and renamed into place, so readers
+  never see a partially written state. Callers hold the shared lock of the state, and errors are
+  raised since the other workers rely on the state.
+  """
+  snapshots_folder.mkdir(parents=True, exist_ok=True)
+
+  with tempfile.NamedTemporaryFile(
+    dir=snapshots_folder, prefix=f"{name}.state.", suffix=".tmp", delete=False,
+  ) as state_file:
+    pickle.dump(state, state_file)
+
+  os.replace(state_file.name, snapshots_folder / f"{name}.state")
+
+def load_shared_state(name: str) -> Any | None:
+  try:
+    with open(snapshots_folder / f"{name}.state", "rb") as state_file:
+      return pickle.load(state_file)
+  except FileNotFoundError:
+    return None
+
+def get_shared_state_signature(name: str) -> Tuple[int, int] | None:
+  """
+  Returns the inode and modification time of the shared state file (which change every time the
+  state is saved), or None if no state was saved.
+  """
+  try:
+    state_stat = os.stat(snapshots_folder / f"{name}.state")
+    return state_stat.st_ino, state_stat.st_mtime_ns
+  except FileNotFoundError:
+    return None
+
+def request_refresh(name: str) -> None:
+  """
+  Asks the refresher process to refresh a cached dataset (used by workers that do not refresh
+  the cached data themselves).
+  """
+  snapshots_folder.mkdir(parents=True, exist_ok=True)
+  (snapshots_folder / f"{name}.refresh").touch()
+
+def pop_refresh_requests() -> List[str]:
+  """
+  Returns the names of the cached datasets other workers asked to refresh, and clears the requests.
+  """
+  names: List[str] = []
+
+  for request_path in snapshots_folder.glob("*.refresh"):
+    try:
+      request_path.unlink()
+      names.append(request_path.stem)
+    except FileNotFoundError:
+      continue
+
+  return names
@@ -0,0 +1,229 @@
+from fastapi.concurrency import run_in_threadpool
+from google.oauth2 import service_account
+from google.auth.transport.requests import Request
+from typing import Any, Dict, List
+from urllib.parse import quote
+import asyncio
+import os
+import httpx
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+
+# The size of the connection pool shared by all Google API calls. Requests beyond the maximum wait
+# for a free connection (HTTP/2 connections also multiplex concurrent requests)
+MAX_CONNECTIONS = int(os.getenv("GOOGLE_API_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GOOGLE_API_MAX_KEEPALIVE_CONNECTIONS", "10"))
+
+# The HTTP client shared by all Google API calls (created on first use, see get_http_client)
+http_client: httpx.AsyncClient | None = None
+
+class GoogleApiError(Exception):
+  """
+  An error response of a Google API.
+
+  Args:
+    status_code (int): The HTTP status code of the response.
+    reason (str): The error message of the response (or the HTTP reason phrase).
+  """
+  def __init__(self, status_code: int, reason: str) -> None:
+    super().__init__(reason)
+    self.status_code = status_code
+    self.reason = reason
+
+def get_http_client() -> httpx.AsyncClient:
+  """
+  Returns the HTTP client shared by all Google API calls.
+
+  The client keeps its connections to the Google APIs open and multiplexes concurrent requests
+  over HTTP/2, so concurrent calls do not each need their own connection (or thread).
+  """
+  global http_client
+
+  if http_client is None:
+    http_client = httpx.AsyncClient(
+      http2=True,
+      limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+      ),
+      timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+
+  return http_client
+
+async def close_http_client() -> None:
+  """
+  Closes the connections of the shared HTTP client (on shutdown).
+  """
+  global http_client
+
+  if http_client is not None:
+    await http_client.aclose()
+    http_client = None
+
+class GoogleApiClient:
+  """
+  Sends authorized requests to a Google API with the service account credentials.
+
+  The credentials are loaded on the first request, and their access token is refreshed with
+  google-auth whenever it expired. Refreshes are serialized, so concurrent requests that find an
+  expired token wait for a single refresh instead of refreshing the shared credentials at once.
+
+  Args:
+    base_url (str): The URL of the API that request paths are relative to.
+    scopes (List[str]): The OAuth scopes of the access token.
+    keys_file (str, optional): The service account keys file.
+  """
+  def __init__(
+    self, base_url: str, scopes: List[str], keys_file: str = "google-api-keys-file.json",
+  ) -> None:
+    self.base_url = base_url
+    self.scopes = scopes
+    self.keys_file = keys_file
+    self.credentials: Any = None
+    self.refresh_lock = asyncio.Lock()
+
+  async def get_access_token(self) -> str:
+    if self.credentials is not None and self.credentials.valid:
+      return self.credentials.token
+
+    async with self.refresh_lock:
+      if self.credentials is None:
+        self.credentials = service_account.Credentials.from_service_account_file(
+          self.keys_file, scopes=self.scopes,
+        )
+
+      # Another request may have refreshed the token while this one waited for the lock
+      if not self.credentials.valid:
+        # google-auth refreshes tokens synchronously (only once per token lifetime)
+        await run_in_threadpool(self.credentials.refresh, Request())
+
+      return self.credentials.token
+
+  async def send(
+    self,
+    method: str,
+    path: str,
+    params: Dict[str, Any] | None = None,
+    json: Dict[str, Any] | None = None,
+  ) -> httpx.Response:
+    """
+    Sends a request to the API and returns the response.
+
+    Raises:
+      GoogleApiError: If the API responds with an error status code.
+    """
+    access_token = await self.get_access_token()
+
+    response = await get_http_client().request(
+      method=method,
+      url=self.base_url + path,
+      params=params,
+      json=json,
+      headers={"Authorization": f"Bearer {access_token}"},
+    )
+
+    if response.is_error:
+      raise GoogleApiError(status_code=response.status_code, reason=get_error_reason(response))
+
+    return response
+
+  async def request(
+    self,
+    method: str,
+    path: str,
+    params: Dict[str, Any] | None = None,
+    json: Dict[str, Any] | None = None,
+  ) -> Dict[str, Any]:
+    """
+    Sends a request to the API and returns the JSON body of the response.
+    """
+    response = await self.send(method=method, path=path, params=params, json=json)
+    return response.json() if response.content else {}
+
+class SheetsClient(GoogleApiClient):
+  """
+  The Google Sheets API operations used by the app.
+  """
+  def __init__(self) -> None:
+    super().__init__(
+      base_url=SHEETS_API_URL, scopes=["https://www.googleapis.com/auth/spreadsheets"],
+    )
+
+  async def values_get(self, spreadsheet_id: str, range: str, **params: Any) -> Dict[str, Any]:
+    return await self.request(
+      method="GET", path=f"/{spreadsheet_id}/values/{quote(range, safe='')}", params=params,
+    )
+
+  async def values_batch_get(
+    self, spreadsheet_id: str, ranges: List[str], **params: Any,
+  ) -> Dict[str, Any]:
+    return await self.request(
+      method="GET", path=f"/{spreadsheet_id}/values:batchGet", params={"ranges": ranges, **params},
+    )
+
+  async def values_update(
+    self, spreadsheet_id: str, range: str, body: Dict[str, Any], **params: Any,
+  ) -> Dict[str, Any]:
+    return await self.request(
+      method="PUT", path=f"/{spreadsheet_id}/values/{quote(range, safe='')}",
+      params=params, json=body,
+    )
+
+  async def values_append(
+    self, spreadsheet_id: str, range: str, body: Dict[str, Any], **params: Any,
+  ) -> Dict[str, Any]:
+    return await self.request(
+      method="POST", path=f"/{spreadsheet_id}/values/{quote(range, safe='')}:append",
+      params=params, json=body,
+    )
+
+  async def values_batch_update(self, spreadsheet_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return await self.request(
+      method="POST", path=f"/{spreadsheet_id}/values:batchUpdate", json=body,
+    )
+
+  async def get(self, spreadsheet_id: str, **params: Any) -> Dict[str, Any]:
+    return await self.request(method="GET", path=f"/{spreadsheet_id}", params=params)
+
+  async def batch_update(self, spreadsheet_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return await self.request(method="POST", path=f"/{spreadsheet_id}:batchUpdate", json=body)
+
+class DriveClient(GoogleApiClient):
+  """
+  The Google Drive API operations used by the app.
+  """
+  def __init__(self) -> None:
+    super().__init__(base_url=DRIVE_API_URL, scopes=["https://www.googleapis.com/auth/drive"])
+
+  async def files_get(self, file_id: str, **params: Any) -> Dict[str, Any]:
+    return await self.request(method="GET", path=f"/files/{file_id}", params=params)
+
+  async def files_list(self, **params: Any) -> Dict[str, Any]:
+    return await self.request(method="GET", path="/files", params=params)
+
+  async def files_copy(self, file_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return await self.request(method="POST", path=f"/files/{file_id}/copy", json=body)
+
+  async def files_get_media(self, file_id: str) -> bytes:
+    response = await self.send(method="GET", path=f"/files/{file_id}", params={"alt": "media"})
+    return response.content
+
+  async def permissions_create(
+    self, file_id: str, body: Dict[str, Any], **params: Any,
+  ) -> Dict[str, Any]:
+    return await self.request(
+      method="POST", path=f"/files/{file_id}/permissions", params=params, json=body,
+    )
+
+def get_error_reason(response: httpx.Response) -> str:
+  """
+  Returns the error message of a Google API error response (or its HTTP reason phrase).
+  """
+  try:
+    return response.json()["error"]["message"]
+  except Exception:
+    return response.reason_phrase
+
+sheets_client = SheetsClient()
+drive_client = DriveClient()
@@ -1,34 +1,16 @@
 from fastapi import HTTPException, status
-from fastapi.concurrency import run_in_threadpool
-from google.oauth2 import service_account
-from googleapiclient.discovery import build #type: ignore
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
-from typing import Dict, List, Any
-from functools import lru_cache
+from typing import Dict, List
 import io
 import asyncio
 
+from api.services.google_api.client import DriveClient, GoogleApiError, drive_client as default_drive_client
+from api.services.utils import refresh_metrics as metrics
 from api.models.drive import FileCopyData
 
-@lru_cache()
-def get_drive_service() -> Any:
-  """
-  Singleton function to initialize and return Google Drive API client.
-  Ensures that the client is only created once and reused for all requests.
-  """
-  # Create credentials
-  credentials = service_account.Credentials.from_service_account_file(
-    "google-api-keys-file.json",
-    scopes=["https://www.googleapis.com/auth/drive"],
-  )
-  # Initialize the Google Drive API client
-  return build(serviceName="drive", version="v3", credentials=credentials)
-
 async def get_folder_contents(
     folder_id: str,
     retries: int = 3,
-    drive_service: Any = get_drive_service(),
+    drive_client: DriveClient = default_drive_client,
   ) -> Dict[str, List[Dict[str, str]]]:
   """
   Fetch the contents of a specified Google Drive folder, including subfolders and spreadsheets.
@@ -50,7 +32,8 @@ async def get_folder_contents(
   Returns:
     dict: A dictionary containing the lists of subfolders and spreadsheets in the folder. 
         The dictionary has two keys: "folders" and "spreadsheets", both of which map to 
-        lists of dictionaries. Each dictionary contains 'name' and 'id' for the files.
+        lists of dictionaries. Each dictionary contains 'name', 'id', 'modified_time' and 'version'
+        for the files.
         
   Raises:
     HttpException: Code 400 for empty folder, and Code 500 for other errors.
@@ -58,8 +41,8 @@ async def get_folder_contents(
   Example:
     >>> get_folder_contents(folder_id="your-folder-id")
     {
-      'folders': [{'name': 'Subfolder1', 'id': 'subfolder-id1'}],
-      'spreadsheets': [{'name': 'Spreadsheet1', 'id': 'spreadsheet-id1'}]
+      'folders': [{'name': 'Subfolder1', 'id': 'subfolder-id1', 'modified_time': '...', 'version': '3'}],
+      'spreadsheets': [{'name': 'Spreadsheet1', 'id': 'spreadsheet-id1', 'modified_time': '...', 'version': '8'}]
     }
   """
   results: Dict[str, List[Dict[str, str]]] = { "folders": [], "spreadsheets": [], }
@@ -67,7 +50,9 @@ async def get_folder_contents(
 
   # Check if folder exists and is accesible
   try:
-    await run_in_threadpool(drive_service.files().get(fileId=folder_id).execute)
+    with metrics.measure_phase("drive_listing"):
+      await drive_client.files_get(file_id=folder_id)
+    metrics.record_api_call()
   except Exception as e:
     raise HTTPException(
       status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -79,12 +64,12 @@ async def get_folder_contents(
   while attempt <= retries:
     try:
       # Call the Drive API to fetch contents from the specified folder
-      response = await run_in_threadpool(
-        drive_service.files().list(
+      with metrics.measure_phase("drive_listing"):
+        response = await drive_client.files_list(
           q=f"'{folder_id}' in parents",
-          fields="files(name, id, mimeType)",
-        ).execute
-      )
+          fields="files(name, id, mimeType, modifiedTime, version)",
+        )
+      metrics.record_api_call()
 
       # Extract files data from API response 
       files = response.get("files", [])
@@ -98,7 +83,12 @@ async def get_folder_contents(
       
       # Append folder and spreadsheet file data to results
       for file in files:
-        file_info: Dict[str, str] = { "name": file.get("name", ""), "id": file.get("id", ""), }
+        file_info: Dict[str, str] = {
+          "name": file.get("name", ""),
+          "id": file.get("id", ""),
+          "modified_time": file.get("modifiedTime", ""),
+          "version": file.get("version", ""),
+        }
         if file.get("mimeType") == "application/vnd.google-apps.folder":
           results["folders"].append(file_info)
         elif file.get("mimeType") == "application/vnd.google-apps.spreadsheet":
@@ -107,14 +97,15 @@ async def get_folder_contents(
       print("Retrieved folder contents.")
       return results # Return the fetched contents
 
-    except HttpError as http_error:
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Drive API
-      status_code = http_error.resp.status
+      status_code = http_error.status_code
       # Handle drive quota exceeded error
       if status_code == 429:
         if attempt < retries:
           wait_time = 2 ** attempt # Exponential backoff
           print(f"Drive Quota exceeded. Will retry in {wait_time} seconds...")
+          metrics.record_api_retry()
           await asyncio.sleep(wait_time)
           attempt += 1
         else:
@@ -143,7 +134,7 @@ async def get_folder_contents(
 async def download_xlsx_file(
   file_id: str,
   retries: int = 3,
-  drive_service: Any = get_drive_service(),
+  drive_client: DriveClient = default_drive_client,
 ) -> io.BytesIO:
   attempt: int = 0
 
@@ -151,30 +142,23 @@ async def download_xlsx_file(
 
   while attempt < retries:
     try:
-      # Run blocking I/O operation in a threadpool to avoid blocking the event loop
-      request = await run_in_threadpool(drive_service.files().get_media, fileId=file_id)
-
-      file = io.BytesIO()
-      downloader = MediaIoBaseDownload(file, request=request)
-
-      done: bool = False
-      while not done:
-        # Download chunks in threadpool
-        _, done = await run_in_threadpool(downloader.next_chunk)
+      with metrics.measure_phase("drive_download"):
+        file = io.BytesIO(await drive_client.files_get_media(file_id=file_id))
 
-      file.seek(0)
+      metrics.record_api_call(bytes_downloaded=file.getbuffer().nbytes)
 
       print("Retrieved xlsx file contents.")
       return file
     
-    except HttpError as http_error:
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Drive API
-      status_code = http_error.resp.status
+      status_code = http_error.status_code
       # Handle drive quota exceeded error
       if status_code == 429:
         if attempt < retries:
           wait_time = 2 ** attempt # Exponential backoff
           print(f"Drive Quota exceeded. Will retry in {wait_time} seconds...")
+          metrics.record_api_retry()
           await asyncio.sleep(wait_time)
           attempt += 1
         else:
@@ -199,7 +183,7 @@ async def download_xlsx_file(
 async def create_copy_of_file(
   file_data: FileCopyData,
   retries: int = 3,
-  drive_service: Any = get_drive_service(),
+  drive_client: DriveClient = default_drive_client,
 ) -> str:
   """
   Create a copy of a specified Google Drive file and place it in a target folder with a new name.
@@ -222,11 +206,9 @@ async def create_copy_of_file(
   while attempt < retries:
     try:
       # Call Drive API to make copy of specified source file
-      new_file = await run_in_threadpool(
-        drive_service.files().copy(
-          fileId=file_data.source_file_id,
-          body={ "name": file_data.new_file_name, "parents": [file_data.placement_folder_id] },
-        ).execute
+      new_file = await drive_client.files_copy(
+        file_id=file_data.source_file_id,
+        body={ "name": file_data.new_file_name, "parents": [file_data.placement_folder_id] },
       )
 
       # get id of created file
@@ -235,9 +217,9 @@ async def create_copy_of_file(
       print("Created file copy.")
       return new_file_id # Return the id of created file
     
-    except HttpError as http_error:
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Drive API
-      status_code = http_error.resp.status
+      status_code = http_error.status_code
       # Handle drive quota exceeded error
       if status_code == 429:
         if attempt < retries:
@@ -270,7 +252,7 @@ async def create_permissions(
   permission_type: str,
   send_notifications: bool = False,
   retries: int = 3,
-  drive_service: Any = get_drive_service(),
+  drive_client: DriveClient = default_drive_client,
 ) -> None:
   """
   Create permissions for a Google Drive resource (file or folder) and grant access to specified users.
@@ -309,21 +291,19 @@ async def create_permissions(
     while attempt < retries:
       try:
         # Call Drive API to create user permissions for specified resource
-        await run_in_threadpool(
-          drive_service.permissions().create(
-            fileId=resource_id,
-            body=body,
-            fields="id",
-            sendNotificationEmail=send_notifications,
-          ).execute
+        await drive_client.permissions_create(
+          file_id=resource_id,
+          body=body,
+          fields="id",
+          sendNotificationEmail=send_notifications,
         )
 
         print("Created permissions successfully")
         break
 
-      except HttpError as http_error:
+      except GoogleApiError as http_error:
         # Handle HTTP errors returned by the Drive API
-        status_code = http_error.resp.status
+        status_code = http_error.status_code
         # Handle drive quota exceeded error
         if status_code == 429:
           if attempt < retries:
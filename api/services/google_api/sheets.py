@@ -1,32 +1,16 @@
 from fastapi import HTTPException, status
-from fastapi.concurrency import run_in_threadpool
-from google.oauth2 import service_account
-from googleapiclient.discovery import build # type: ignore
-from googleapiclient.errors import HttpError
-from functools import lru_cache
 from typing import Any, List, Dict
 import asyncio
 
-@lru_cache()
-def get_sheets_service() -> Any:
-  """
-  Singleton function to initialize and return Google Sheets API client.
-  Ensures that the client is only created once and reused for all requests.
-  """
-  # Create credentials
-  credentials = service_account.Credentials.from_service_account_file(
-    "google-api-keys-file.json",
-    scopes=["https://www.googleapis.com/auth/spreadsheets"],
-  )
-  # Initialize the Google Drive API client
-  return build(serviceName="sheets", version="v4", credentials=credentials)
+from api.services.google_api.client import SheetsClient, GoogleApiError, sheets_client as default_sheets_client
+from api.services.utils import refresh_metrics as metrics
 
 async def get_values(
   spreadsheet_id: str,
   sheet_name: str,
   cell_range: str | None = None,
   retries: int = 3,
-  sheets_service: Any = get_sheets_service(),
+  sheets_client: SheetsClient = default_sheets_client,
 ) -> List[List[Any]]:
   """
   Fetch values from a specified range in a Google Sheets spreadsheet.
@@ -65,16 +49,16 @@ async def get_values(
   while attempt <= retries:
     try:
       # Call the Sheets API to fetch data from the specified range
-      result = await run_in_threadpool(
-          sheets_service.spreadsheets().values().get(
-          spreadsheetId=spreadsheet_id,
+      with metrics.measure_phase("sheets_fetch"):
+        result = await sheets_client.values_get(
+          spreadsheet_id=spreadsheet_id,
           range=f"{sheet_name}{f"!{cell_range}" if cell_range else ""}",
           valueRenderOption='UNFORMATTED_VALUE',
-        ).execute
-      )
+        )
 
       # Extract values from the API response
       values: List[List[Any]] | None = result.get("values", None)
+      metrics.record_api_call(cells_fetched=sum(len(row) for row in values or []))
 
       # Raise an exception if no data is found in the specified range
       if values is None:
@@ -89,7 +73,7 @@ async def get_values(
     except HTTPException:
       raise
     
-    except HttpError as http_error:
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Sheets API
       await handle_http_exceptions(
         http_error=http_error,
@@ -106,11 +90,96 @@ async def get_values(
     
   return [[""]]
 
+async def batch_get_values(
+  spreadsheet_id: str,
+  sheet_names: List[str],
+  cell_ranges: List[str | None] | None = None,
+  retries: int = 3,
+  sheets_client: SheetsClient = default_sheets_client,
+) -> List[List[List[Any]]]:
+  """
+  Fetch the values of several sheets (or sheet ranges) of a Google Sheets spreadsheet with one
+  request.
+
+  Works like get_values, but retrieves all ranges in a single `spreadsheets.values.batchGet` call
+  (one round-trip and one read request of the quota).
+
+  Args:
+    spreadsheet_id (str): The ID of the Google Sheets spreadsheet to retrieve values from.
+    sheet_names (List[str]): The names of the sheets in the spreadsheet to fetch data from.
+    cell_ranges (List[str | None], optional): The A1 notation range of each sheet name (e.g.
+                                             '2:10001'). If not provided (or None for a sheet),
+                                             the entire sheet is used.
+    retries (int, optional): The number of retry attempts in case of quota-related errors (HTTP 429).
+                            Defaults to 3.
+
+  Returns:
+    List[List[List[Any]]]: The values of each range (in the order of sheet_names) as a 2D list.
+                          Ranges without values are returned as empty lists.
+
+  Raises:
+    HTTPException: an error with a status code of 400 or 500, with a detail property (also for
+                  rejected requests, e.g. a sheet that does not exist, which are not retried).
+  """
+  attempt: int = 0
+
+  print(
+    f"Retrieving values from {', '.join(dict.fromkeys(sheet_names))} sheets" +
+    f" from spreadsheet: {spreadsheet_id}..."
+  )
+
+  # Quote the sheet names for A1 notation
+  ranges = ["'" + sheet_name.replace("'", "''") + "'" for sheet_name in sheet_names]
+  if cell_ranges is not None:
+    ranges = [
+      f"{sheet_range}!{cell_range}" if cell_range else sheet_range
+      for sheet_range, cell_range in zip(ranges, cell_ranges)
+    ]
+
+  while attempt <= retries:
+    try:
+      # Call the Sheets API to fetch all ranges
+      with metrics.measure_phase("sheets_fetch"):
+        result = await sheets_client.values_batch_get(
+          spreadsheet_id=spreadsheet_id, ranges=ranges, valueRenderOption='UNFORMATTED_VALUE',
+        )
+
+      # Extract the values of each range from the API response
+      sheets_values: List[List[List[Any]]] = [
+        value_range.get("values", []) for value_range in result.get("valueRanges", [])
+      ]
+      metrics.record_api_call(
+        cells_fetched=sum(len(row) for values in sheets_values for row in values),
+      )
+
+      print("Retrieved values from spreadsheet sheets.")
+      return sheets_values
+
+    except GoogleApiError as http_error:
+      # Handle HTTP errors returned by the Sheets API
+      await handle_batch_http_exceptions(
+        http_error=http_error,
+        retries=retries,
+        attempt=attempt,
+      )
+      attempt += 1
+
+    except Exception as e:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=str(e),
+      )
+
+  raise HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="Sheets quota and max retries exceeded.",
+  )
+
 async def get_sheet_properties(
   spreadsheet_id: str,
   sheet_name: str,
   retries: int = 3,
-  sheets_service: Any = get_sheets_service(),
+  sheets_client: SheetsClient = default_sheets_client,
 ) -> Dict[str, int | Dict[str, int]]:
   """
   Retrieve the sheet properties (sheetID, row and column count) for a specific sheet within a Google Sheets spreadsheet.
@@ -132,12 +201,12 @@ async def get_sheet_properties(
   while attempt < retries:
     try:
       # Fetch metadata of sheets in specified spreadsheet
-      sheet_metadata = await run_in_threadpool(
-        sheets_service.spreadsheets().get(
-          spreadsheetId=spreadsheet_id,
+      with metrics.measure_phase("sheets_fetch"):
+        sheet_metadata = await sheets_client.get(
+          spreadsheet_id=spreadsheet_id,
           fields="sheets(properties.gridProperties,properties.title,properties.sheetId)",
-        ).execute
-      )
+        )
+      metrics.record_api_call()
       
       # Extract the relevant sheet's grid properties
       sheets = sheet_metadata.get("sheets", [])
@@ -148,15 +217,24 @@ async def get_sheet_properties(
 
           print("Retrieved sheet grid properties.")
           return {"sheet_id": properties.get("sheetId"), "grid_properties": grid_properties}
-    
-    except HttpError as http_error:
+
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Sheet with this name does not exist in spreadsheet.",
+      )
+
+    except HTTPException:
+      raise
+
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Sheets API
-      status_code = http_error.resp.status
+      status_code = http_error.status_code
       # Handle drive quota exceeded error
       if status_code == 429:
         if attempt < retries:
           wait_time = 2 ** attempt # Exponential backoff
           print(f"Sheets Quota exceeded. Will retry in {wait_time} seconds...")
+          metrics.record_api_retry()
           await asyncio.sleep(wait_time)
           attempt += 1
         else:
@@ -185,7 +263,7 @@ async def post_values(
   cell_range: str | None = None,
   user_entered: bool = True,
   retries: int = 3,
-  sheets_service: Any = get_sheets_service(),
+  sheets_client: SheetsClient = default_sheets_client,
 ) -> None:
   """
   Post values to a specified range in a Google Sheets spreadsheet.
@@ -221,19 +299,19 @@ async def post_values(
   while attempt <= retries:
     try:
       # Call the sheets API to post values in the specified range
-      await run_in_threadpool(
-        sheets_service.spreadsheets().values().update(
-          spreadsheetId=spreadsheet_id,
+      with metrics.measure_phase("sheets_write"):
+        await sheets_client.values_update(
+          spreadsheet_id=spreadsheet_id,
           range=f"{sheet_name}{f"!{cell_range}" if cell_range else ""}",
           valueInputOption="USER_ENTERED" if user_entered else "RAW",
           body={"values": values},
-        ).execute
-      )
+        )
+      metrics.record_api_call()
 
       print("Posted value to sheet.")
       return
 
-    except HttpError as http_error:
+    except GoogleApiError as http_error:
       # Handle HTTP errors returned by the Sheets API
       await handle_http_exceptions(
         http_error=http_error,
@@ -247,89 +325,261 @@ async def post_values(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail=str(e),
       )
-  
-async def delete_rows(
-    spreadsheet_id: str,
-    sheet_id: int,
-    start_index: int,
-    end_index: int,
-    retries: int = 3,
-    sheets_service: Any = get_sheets_service(),
-  ) -> None:
-    """
-    Delete a group of rows in a Google Sheets spreadsheet.
-
-    Args:
-      spreadsheet_id (str): The ID of the Google Sheets spreadsheet.
-      sheet_id (int): The ID of the sheet where rows will be deleted.
-      start_index (int): The index of the first row to delete (0-based index).
-      end_index (int): The index of the row after the last row to delete (non-inclusive).
-
-    Returns:
-        None
-    """
-    # Create the request to delete the specified rows
-    delete_request: Dict[str, List[Dict[str, Dict[str, Dict[str, int | str]]]]] = {
-      "requests": [
-        {
-          "deleteDimension": {
-            "range": {
-              "sheetId": sheet_id,
-              "dimension": "ROWS",
-              "startIndex": start_index,
-              "endIndex": end_index
-            }
-          }
-        }
-      ]
-    }
 
-    attempt: int = 0
+async def append_values(
+  values: list[list[Any]],
+  spreadsheet_id: str,
+  sheet_name: str,
+  user_entered: bool = True,
+  retries: int = 3,
+  sheets_client: SheetsClient = default_sheets_client,
+) -> None:
+  """
+  Append rows of values after the last row with data in a Google Sheets sheet.
+
+  The rows are inserted as new rows (existing rows are never overwritten), so the sheet does not
+  need to be read first to find the next empty row. Retries quota exceeded errors (HTTP 429) with
+  exponential backoff like post_values.
 
-    print("Deleting extra rows from sheet...")
+  Args:
+    values (list[list[any]]): A 2D list of values to append to the sheet. Each inner list represents a row.
+    spreadsheet_id (str): The ID of the Google Sheets spreadsheet where values should be appended.
+    sheet_name (str): The name of the sheet within the spreadsheet where values should be appended.
+    user_entered (bool, optional): If True, values are interpreted by Google Sheets. Defaults to True.
+    retries (int, optional): The number of retry attempts in case of quota-related errors. Defaults to 3.
 
-    while attempt < retries:
-      try:
-        # Execute the batchUpdate request to delete the rows
-        await run_in_threadpool(
-          sheets_service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body=delete_request,
-          ).execute
+  Raises:
+    HTTPException: Raised if a non-retriable HTTP error occurs (e.g., 404 for missing spreadsheet or sheet).
+  """
+  attempt: int = 0
+
+  print(f"Appending {len(values)} rows to {sheet_name} sheet of spreadsheet: {spreadsheet_id}...")
+
+  while attempt <= retries:
+    try:
+      # Call the sheets API to append the rows after the data of the sheet
+      with metrics.measure_phase("sheets_write"):
+        await sheets_client.values_append(
+          spreadsheet_id=spreadsheet_id,
+          range=sheet_name,
+          valueInputOption="USER_ENTERED" if user_entered else "RAW",
+          insertDataOption="INSERT_ROWS",
+          body={"values": values},
         )
+      metrics.record_api_call()
 
-        print("Deleted extra rows.")
-        return
-
-      except HttpError as http_error:
-        # Handle HTTP errors returned by the Sheets API
-        status_code = http_error.resp.status
-        # Handle drive quota exceeded error
-        if status_code == 429:
-          if attempt < retries:
-            wait_time = 2 ** attempt # Exponential backoff
-            print(f"Sheets Quota exceeded. Will retry in {wait_time} seconds...")
-            await asyncio.sleep(wait_time)
-            attempt += 1
-          else:
-            raise HTTPException(
-              status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-              detail="Sheets quota and max retries exceeded."
-            )
-        else:
-          raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=http_error.reason,
-          )
-        
-      except Exception as e:
-        raise HTTPException(
-          status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-          detail=str(e),
+      print("Appended rows to sheet.")
+      return
+
+    except GoogleApiError as http_error:
+      # Handle HTTP errors returned by the Sheets API
+      await handle_http_exceptions(
+        http_error=http_error,
+        retries=retries,
+        attempt=attempt,
+      )
+      attempt += 1
+
+    except Exception as e:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=str(e),
+      )
+
+async def batch_post_values(
+  value_ranges: List[Dict[str, Any]],
+  spreadsheet_id: str,
+  user_entered: bool = True,
+  retries: int = 3,
+  sheets_client: SheetsClient = default_sheets_client,
+) -> None:
+  """
+  Post values to several ranges (of any sheets) of a Google Sheets spreadsheet with one request.
+
+  Works like post_values for each range, but posts all ranges in a single
+  `spreadsheets.values.batchUpdate` call.
+
+  Args:
+    value_ranges (List[Dict[str, Any]]): The ranges to post, each with the A1 notation "range"
+                                        (including the sheet name) and the 2D list of "values".
+    spreadsheet_id (str): The ID of the Google Sheets spreadsheet where values should be posted.
+    user_entered (bool, optional): If True, values are interpreted by Google Sheets. Defaults to True.
+    retries (int, optional): The number of retry attempts in case of quota-related errors. Defaults to 3.
+
+  Raises:
+    HTTPException: Raised if any HTTP error other than exceeded quota occurs (e.g., 404 for missing
+                  spreadsheet or 400 for a range that does not exist), or if the retries are exceeded.
+  """
+  attempt: int = 0
+
+  print(f"Posting values to {len(value_ranges)} ranges of spreadsheet: {spreadsheet_id}...")
+
+  while attempt <= retries:
+    try:
+      # Call the sheets API to post the values of all ranges
+      with metrics.measure_phase("sheets_write"):
+        await sheets_client.values_batch_update(
+          spreadsheet_id=spreadsheet_id,
+          body={
+            "valueInputOption": "USER_ENTERED" if user_entered else "RAW",
+            "data": value_ranges,
+          },
+        )
+      metrics.record_api_call()
+
+      print("Posted values to all ranges.")
+      return
+
+    except GoogleApiError as http_error:
+      # Handle HTTP errors returned by the Sheets API
+      await handle_batch_http_exceptions(
+        http_error=http_error,
+        retries=retries,
+        attempt=attempt,
+      )
+      attempt += 1
+
+    except Exception as e:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=str(e),
+      )
+
+  raise HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="Sheets quota and max retries exceeded.",
+  )
+
+async def get_sheet_ids(
+  spreadsheet_id: str,
+  retries: int = 3,
+  sheets_client: SheetsClient = default_sheets_client,
+) -> Dict[str, int]:
+  """
+  Retrieve the sheet IDs of all sheets in a Google Sheets spreadsheet (by sheet name) with one request.
+
+  Raises:
+    HTTPException: an error with a status code of 400 or 500, with a detail property.
+  """
+  attempt: int = 0
+
+  print(f"Retrieving sheet IDs of spreadsheet: {spreadsheet_id}...")
+
+  while attempt <= retries:
+    try:
+      with metrics.measure_phase("sheets_fetch"):
+        sheet_metadata = await sheets_client.get(
+          spreadsheet_id=spreadsheet_id, fields="sheets(properties.title,properties.sheetId)",
         )
+      metrics.record_api_call()
+
+      print("Retrieved sheet IDs.")
+      return {
+        sheet["properties"]["title"]: sheet["properties"]["sheetId"]
+        for sheet in sheet_metadata.get("sheets", [])
+      }
+
+    except GoogleApiError as http_error:
+      # Handle HTTP errors returned by the Sheets API
+      await handle_batch_http_exceptions(
+        http_error=http_error,
+        retries=retries,
+        attempt=attempt,
+      )
+      attempt += 1
+
+    except Exception as e:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=str(e),
+      )
+
+  raise HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="Sheets quota and max retries exceeded.",
+  )
+
+async def update_spreadsheet(
+  requests: List[Dict[str, Any]],
+  spreadsheet_id: str,
+  retries: int = 3,
+  sheets_client: SheetsClient = default_sheets_client,
+) -> None:
+  """
+  Apply several updates (e.g. sheet property changes) to a Google Sheets spreadsheet with one
+  `spreadsheets.batchUpdate` request. The updates are applied together (if one fails, none are).
+
+  Args:
+    requests (List[Dict[str, Any]]): The batchUpdate requests.
+    spreadsheet_id (str): The ID of the Google Sheets spreadsheet.
+    retries (int, optional): The number of retry attempts in case of quota-related errors. Defaults to 3.
+
+  Raises:
+    HTTPException: Raised if any HTTP error other than exceeded quota occurs, or if the retries are
+                  exceeded. Invalid requests (e.g. a sheet ID that does not exist) raise a 400 error
+                  with the message of the Sheets API.
+  """
+  attempt: int = 0
+
+  print(f"Applying {len(requests)} updates to spreadsheet: {spreadsheet_id}...")
+
+  while attempt <= retries:
+    try:
+      with metrics.measure_phase("sheets_write"):
+        await sheets_client.batch_update(spreadsheet_id=spreadsheet_id, body={"requests": requests})
+      metrics.record_api_call()
+
+      print("Applied spreadsheet updates.")
+      return
+
+    except GoogleApiError as http_error:
+      # Handle HTTP errors returned by the Sheets API
+      await handle_batch_http_exceptions(
+        http_error=http_error,
+        retries=retries,
+        attempt=attempt,
+      )
+      attempt += 1
+
+    except Exception as e:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=str(e),
+      )
+
+  raise HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="Sheets quota and max retries exceeded.",
+  )
+
+async def handle_batch_http_exceptions(
+  http_error: GoogleApiError,
+  retries: int,
+  attempt: int,
+) -> None:
+  """
+  Handle HTTP errors returned by the Google Sheets API for requests of several sheets or ranges.
+
+  Works like handle_http_exceptions, but only quota exceeded errors (HTTP 429) are retried. All
+  other errors are raised (including errors handle_http_exceptions does not recognize), so a
+  rejected request is never mistaken for sheets without values.
+
+  Raises:
+    HTTPException: 400 for rejected requests, or 500 for other errors and exceeded retries.
+  """
+  await handle_http_exceptions(http_error=http_error, retries=retries, attempt=attempt)
+
+  if http_error.status_code != 429:
+    raise HTTPException(
+      status_code=(
+        status.HTTP_400_BAD_REQUEST if 400 <= http_error.status_code < 500
+        else status.HTTP_500_INTERNAL_SERVER_ERROR
+      ),
+      detail=http_error.reason,
+    )
 
 async def handle_http_exceptions(
-  http_error: HttpError,
+  http_error: GoogleApiError,
   retries: int,
   attempt: int,
 ) -> None:
@@ -342,7 +592,7 @@ async def handle_http_exceptions(
   backoff for retries in case of quota-related errors.
 
   Args:
-    http_error (HttpError): The error object returned by the Google Sheets API.
+    http_error (GoogleApiError): The error object returned by the Google Sheets API.
                           Contains detailed information about the HTTP error.
     retries (int): The maximum number of retries allowed when handling quota-exceeded errors (HTTP 429).
     attempt (int): The current attempt number. This is used to calculate the exponential backoff delay.
@@ -365,8 +615,8 @@ async def handle_http_exceptions(
     If an HTTP 429 error is encountered during the first attempt, the function waits for 2^1 seconds (2 seconds) 
     before retrying. This delay increases exponentially with each subsequent retry attempt.
   """
-  status_code: int = http_error.resp.status # get error status code
-  error_message = http_error.resp.reason # get error message
+  status_code: int = http_error.status_code # get error status code
+  error_message = http_error.reason # get error message
 
   if status_code == 404:
     raise HTTPException(
@@ -394,6 +644,7 @@ async def handle_http_exceptions(
     if attempt < retries:
       wait_time = 2 ** attempt # Exponential backoff
       print(f"Sheets Quota exceeded. Retrying in {wait_time} seconds...")
+      metrics.record_api_retry()
       await asyncio.sleep(wait_time)
     else:
       raise HTTPException(
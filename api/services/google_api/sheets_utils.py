@@ -3,10 +3,12 @@ from fastapi.concurrency import run_in_threadpool
 import pandas as pd
 from pandas import DataFrame
 from io import BytesIO
-from typing import Any, List, Dict
+from typing import Any, AsyncIterator, List, Dict
+import asyncio
 
 from api.services.google_api import sheets as sheets_services
 from api.services.google_api import drive as drive_services
+from api.services.utils.refresh_metrics import measure_phase
 from api.models.sheets import SheetValues, SheetProperties
 
 async def get_row_dicts_from_spreadsheet(ss_properties: SheetProperties) -> SheetValues:
@@ -45,16 +47,123 @@ async def get_row_dicts_from_spreadsheet(ss_properties: SheetProperties) -> Shee
       'row_dicts': [{'Name': 'Alice', 'Age': '30'}, {'Name': 'Bob', 'Age': '25'}]
     }
   """
-  spreadsheet_id = ss_properties.id
-  sheet_name = ss_properties.sheet_name
-  required_headers = ss_properties.required_headers
-    
   # Get a List of all row data from spreadsheet (including headers) using get_values()
   all_row_values: List[List[Any]] = await sheets_services.get_values(
-    spreadsheet_id=spreadsheet_id,
-    sheet_name=sheet_name,
+    spreadsheet_id=ss_properties.id,
+    sheet_name=ss_properties.sheet_name,
+  )
+
+  return create_sheet_values(ss_properties=ss_properties, all_row_values=all_row_values)
+
+async def get_row_dicts_from_spreadsheet_sheets(
+  ss_properties_list: List[SheetProperties],
+) -> List[SheetValues]:
+  """
+  Retrieve the rows of several sheets of the same Google Sheets spreadsheet with one request.
+
+  Works like `get_row_dicts_from_spreadsheet` for each sheet, but fetches all sheets with a single
+  batchGet call.
+
+  Args:
+    ss_properties_list (List[SheetProperties]): The properties of the sheets (all with the same
+                                               spreadsheet id).
+
+  Returns:
+    List[SheetValues]: The headers and row dicts of each sheet, in the order of ss_properties_list.
+
+  Raises:
+    HTTPException: If a sheet has no data rows or is missing required headers.
+  """
+  snapshot = await load_spreadsheet_snapshot(ss_properties_list=ss_properties_list)
+
+  return [
+    snapshot.get_row_dicts(ss_properties=ss_properties) for ss_properties in ss_properties_list
+  ]
+
+class SpreadsheetSnapshot:
+  """
+  The values of several sheets of one Google Sheets spreadsheet, fetched together with a single
+  batchGet call (see `load_spreadsheet_snapshot`), so the stages of a pipeline take their sheets
+  from the snapshot instead of each fetching them again.
+
+  Args:
+    spreadsheet_id (str): The ID of the spreadsheet.
+    sheets_values (Dict[str, List[List[Any]]]): The values of each fetched sheet (including the
+                                                header row) by sheet name.
+  """
+  def __init__(self, spreadsheet_id: str, sheets_values: Dict[str, List[List[Any]]]) -> None:
+    self.spreadsheet_id = spreadsheet_id
+    self.sheets_values = sheets_values
+
+  def get_row_dicts(self, ss_properties: SheetProperties) -> SheetValues:
+    """
+    Works like `get_row_dicts_from_spreadsheet` with the fetched values of the sheet. Every call
+    returns new row dicts, so a stage can change its rows without changing the snapshot.
+
+    Raises:
+      HTTPException: If the sheet was not fetched with the snapshot, has no data rows, or is
+                    missing required headers.
+    """
+    if (
+      ss_properties.id != self.spreadsheet_id
+      or ss_properties.sheet_name not in self.sheets_values
+    ):
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"'{ss_properties.sheet_name}' was not fetched with the spreadsheet snapshot.",
+      )
+
+    return create_sheet_values(
+      ss_properties=ss_properties, all_row_values=self.sheets_values[ss_properties.sheet_name],
+    )
+
+async def load_spreadsheet_snapshot(ss_properties_list: List[SheetProperties]) -> SpreadsheetSnapshot:
+  """
+  Fetch the values of all sheets a pipeline needs from one spreadsheet with a single batchGet call.
+
+  The sheets are only fetched here. Their headers and rows are validated when each stage takes
+  them from the snapshot with `SpreadsheetSnapshot.get_row_dicts`.
+
+  Args:
+    ss_properties_list (List[SheetProperties]): The properties of the sheets (all with the same
+                                               spreadsheet id).
+
+  Raises:
+    HTTPException: If the sheets are not in the same spreadsheet, or the sheets cannot be fetched.
+  """
+  spreadsheet_ids = set(ss_properties.id for ss_properties in ss_properties_list)
+  if len(spreadsheet_ids) != 1:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="Sheets retrieved in one request must be in the same spreadsheet.",
+    )
+
+  spreadsheet_id = spreadsheet_ids.pop()
+  # Fetch each sheet once (even if several stages use different properties of the same sheet)
+  sheet_names = list(dict.fromkeys(ss_properties.sheet_name for ss_properties in ss_properties_list))
+
+  sheets_values = await sheets_services.batch_get_values(
+    spreadsheet_id=spreadsheet_id, sheet_names=sheet_names,
+  )
+
+  return SpreadsheetSnapshot(
+    spreadsheet_id=spreadsheet_id, sheets_values=dict(zip(sheet_names, sheets_values)),
   )
 
+def create_sheet_values(
+  ss_properties: SheetProperties, all_row_values: List[List[Any]],
+) -> SheetValues:
+  """
+  Validate the rows of a sheet (including the header row) and convert them into row dicts.
+
+  Raises:
+    HTTPException: If the sheet has fewer than two rows (no data) or if the required headers
+              are not found in the actual headers.
+  """
+  spreadsheet_id = ss_properties.id
+  sheet_name = ss_properties.sheet_name
+  required_headers = ss_properties.required_headers
+
   # Validate sheet contains at least two rows
   if len(all_row_values) < 2:
     raise HTTPException(
@@ -70,16 +179,92 @@ async def get_row_dicts_from_spreadsheet(ss_properties: SheetProperties) -> Shee
   )
 
   # Create dicts for each row with headers from required_headers as the keys
-  row_dicts: List[Dict[str, Any]] = create_row_dicts(
-    required_headers=required_headers,
-    actual_headers=all_row_values[0],
-    rows=all_row_values[1:],
-  )
+  with measure_phase("parse"):
+    row_dicts: List[Dict[str, Any]] = create_row_dicts(
+      required_headers=required_headers,
+      actual_headers=all_row_values[0],
+      rows=all_row_values[1:],
+    )
 
   # Return actual header row and row dicts
   print("Validated and Converted all non-header rows into dicts.")
   return SheetValues(headers=all_row_values[0], row_dicts=row_dicts, spreadsheet_id=spreadsheet_id)
 
+async def get_row_frames_from_spreadsheet(
+  ss_properties: SheetProperties,
+  chunk_size: int = 10000,
+) -> AsyncIterator[DataFrame]:
+  """
+  Retrieve rows from a Google Sheets spreadsheet in chunks of row ranges.
+
+  This function validates the header row of the sheet and then fetches the non-header rows in
+  ranges of `chunk_size` rows, yielding each range as a DataFrame with the `required_headers`
+  as columns. Each range is only fetched when the previous one has been yielded, so only one
+  range of raw sheet values is held in memory at a time and callers can filter each chunk
+  before keeping it.
+
+  Args:
+    ss_properties (SheetProperties): The spreadsheet id, sheet name, and required headers.
+    chunk_size (int, optional): The number of rows fetched with each request. Defaults to 10000.
+
+  Yields:
+    DataFrame: The rows of the next row range, with the `required_headers` as columns.
+
+  Raises:
+    HTTPException: If the sheet has no non-header rows or if the required headers are not found
+                  in the actual headers.
+  """
+  spreadsheet_id = ss_properties.id
+  sheet_name = ss_properties.sheet_name
+  required_headers = ss_properties.required_headers
+
+  # Get the header row and validate it contains all required values
+  header_values: List[List[Any]] = await sheets_services.get_values(
+    spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, cell_range="1:1",
+  )
+  actual_headers: List[str] = header_values[0]
+
+  validate_required_headers_(
+    actual_headers=actual_headers,
+    required_headers=required_headers,
+    sheet_name=sheet_name,
+  )
+
+  # Get the number of rows in the sheet
+  sheet_properties = await sheets_services.get_sheet_properties(
+    spreadsheet_id=spreadsheet_id, sheet_name=sheet_name,
+  )
+  row_count: int = sheet_properties["grid_properties"]["rowCount"] # type: ignore
+
+  has_rows = False
+
+  for start_row in range(2, row_count + 1, chunk_size):
+    end_row = min(start_row + chunk_size - 1, row_count)
+
+    # Fetch one range at a time (a range without any values is returned as an empty list)
+    ranges_rows = await sheets_services.batch_get_values(
+      spreadsheet_id=spreadsheet_id, sheet_names=[sheet_name],
+      cell_ranges=[f"{start_row}:{end_row}"],
+    )
+    rows: List[List[Any]] = ranges_rows[0]
+    del ranges_rows
+    if not rows:
+      continue
+
+    has_rows = True
+    with measure_phase("parse"):
+      row_frame = create_row_frame(
+        required_headers=required_headers, actual_headers=actual_headers, rows=rows,
+      )
+    del rows
+    yield row_frame
+
+  if not has_rows:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Sheet has no cell values in non-header rows.",
+    )
+
 async def get_row_dicts_from_excel_sheet(file_properties: SheetProperties) -> SheetValues:
   """
   Retrieve rows from an Excel sheet in Google Drive and convert them into a List of dictionaries.
@@ -107,9 +292,10 @@ async def get_row_dicts_from_excel_sheet(file_properties: SheetProperties) -> Sh
   excel_file: BytesIO = await drive_services.download_xlsx_file(file_id=file_id)
 
   # Get DataFrame of file using pandas
-  df: DataFrame = await run_in_threadpool(
-    pd.read_excel, excel_file, sheet_name=sheet_name, header=0, # type: ignore
-  )
+  with measure_phase("parse"):
+    df: DataFrame = await run_in_threadpool(
+      pd.read_excel, excel_file, sheet_name=sheet_name, header=0, # type: ignore
+    )
 
   # Get List of row values from DataFrame
   row_values: List[List[str]] = df.values.tolist() # type: ignore
@@ -290,64 +476,214 @@ async def post_row_dicts_to_spreadsheet(
   Workflow:
     1. Converts `row_dicts` to a List of Lists (`row_Lists`) using `row_dicts_to_Lists` for posting.
     2. Determines the A1 notation range for posting data based on the size of the `header_row` and `row_dicts`.
-    3. Posts the data to the specified range in the Google Sheets using `post_values`.
-    4. Optionally, fetches the sheet's grid properties to determine the total row count and deletes any rows 
-        beyond the last posted row if `clear_extra_rows` is True.
+    3. Posts the data to the specified range and, if `clear_extra_rows` is True, trims the sheet to the
+        last posted row with a `SpreadsheetWriteSession`.
 
   Notes:
     - If `clear_extra_rows` is set to True and there are more rows in the sheet than posted, the extra rows 
       are deleted to ensure a clean sheet.
     - The function assumes that the sheet already contains headers in the first row. The posted data starts 
       from row 2 (A2).
+    - To post to several sheets of the same spreadsheet, queue them in one `SpreadsheetWriteSession`.
   """
-  spreadsheet_id = ss_properties.id
-  sheet_name = ss_properties.sheet_name
-  header_row = ss_properties.required_headers
-  
-  # Convert all row dicts to Lists of cell values
-  row_lists: List[List[Any]] = row_dicts_to_lists(
-    header_row=header_row,
-    row_dicts=row_dicts
+  write_session = SpreadsheetWriteSession(spreadsheet_id=ss_properties.id)
+  write_session.post_row_dicts(
+    ss_properties=ss_properties, row_dicts=row_dicts, clear_extra_rows=clear_extra_rows,
   )
+  await write_session.commit()
 
-  # Create range in A1Notation for posting range
-  last_posting_column: str = index_to_column_letter(len(header_row))
-  last_posting_row: int = len(row_lists) + 1
-  cell_range: str = f"A2:{last_posting_column}{last_posting_row}"
+class SpreadsheetWriteSession:
+  """
+  Queues the value writes and row trims of any number of sheets of one Google Sheets spreadsheet,
+  and sends them on commit with one values.batchUpdate call and one spreadsheets.batchUpdate call
+  (instead of a values update, a sheet properties read, and a row deletion per sheet).
 
-  # Post all rows to spreadsheet
-  await sheets_services.post_values(
-    values=row_lists,
-    spreadsheet_id=spreadsheet_id,
-    sheet_name=sheet_name,
-    cell_range=cell_range,
-  )
+  Rows are trimmed by setting the row count of the sheet to the last posted row, which only needs
+  the sheet ID instead of the current row count of the sheet. The sheet IDs are fetched once per
+  session (while the values of the first commit are posted).
 
-  # Clear all extra rows if clear_extra_rows is selected
-  if clear_extra_rows:
-    # Fetch sheet Id and grid properties
-    sheet_properties: Dict[str, int | Dict[str, int]] = await sheets_services.get_sheet_properties(
-      spreadsheet_id=spreadsheet_id,
-      sheet_name=sheet_name,
-    )
+  Args:
+    spreadsheet_id (str): The ID of the spreadsheet.
 
-    # Extract row count from sheet_properties
-    row_count: int = sheet_properties["grid_properties"]["rowCount"] # type: ignore
+  Example:
+    >>> write_session = SpreadsheetWriteSession(spreadsheet_id=spreadsheet_id)
+    >>> write_session.post_row_dicts(ss_properties=BreakdownProperties(id=spreadsheet_id), row_dicts=rows)
+    >>> write_session.post_row_dicts(ss_properties=WorksheetPropertiesNonAts(id=spreadsheet_id), row_dicts=rows)
+    >>> await write_session.commit()
+  """
+  def __init__(self, spreadsheet_id: str) -> None:
+    self.spreadsheet_id = spreadsheet_id
+    self.value_ranges: List[Dict[str, Any]] = []
+    # The number of rows to keep in each sheet that extra rows are cleared from
+    self.row_counts: Dict[str, int] = {}
+    # The sheet IDs of the spreadsheet by sheet name (fetched on the first commit that clears rows)
+    self.sheet_ids: Dict[str, int] | None = None
+
+  def post_values(self, sheet_name: str, values: List[List[Any]], cell_range: str) -> None:
+    """
+    Queues posting values to a range (in A1 notation without the sheet name) of a sheet.
+    """
+    quoted_sheet_name = "'" + sheet_name.replace("'", "''") + "'"
+    self.value_ranges.append({"range": f"{quoted_sheet_name}!{cell_range}", "values": values})
+
+  def post_row_dicts(
+    self,
+    ss_properties: SheetProperties,
+    row_dicts: List[Dict[str, Any]],
+    clear_extra_rows: bool = True,
+  ) -> None:
+    """
+    Queues posting row dicts to a sheet like `post_row_dicts_to_spreadsheet` (starting from row 2,
+    and optionally clearing all rows after the last posted row).
+    """
+    if ss_properties.id != self.spreadsheet_id:
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Sheets posted in one write session must be in the same spreadsheet.",
+      )
 
-    # If extra rows present in sheet, delete extra rows
-    if row_count > last_posting_row:
-      await sheets_services.delete_rows(
-        spreadsheet_id=spreadsheet_id,
-        sheet_id=sheet_properties["sheet_id"], # type: ignore
-        start_index=last_posting_row,
-        end_index=row_count, # type: ignore
+    header_row = ss_properties.required_headers
+
+    # Convert all row dicts to Lists of cell values
+    row_lists: List[List[Any]] = row_dicts_to_lists(header_row=header_row, row_dicts=row_dicts)
+
+    # Create range in A1Notation for posting range
+    last_posting_column: str = index_to_column_letter(len(header_row))
+    last_posting_row: int = len(row_lists) + 1
+
+    if row_lists:
+      self.post_values(
+        sheet_name=ss_properties.sheet_name,
+        values=row_lists,
+        cell_range=f"A2:{last_posting_column}{last_posting_row}",
       )
 
-      print("Cleared extra data rows.")
+    if clear_extra_rows:
+      self.row_counts[ss_properties.sheet_name] = last_posting_row
+
+  async def commit(self) -> None:
+    """
+    Posts all queued values, then clears the extra rows of the sheets, and empties the queues.
+    Nothing is cleared if posting the values fails.
+
+    Raises:
+      HTTPException: If posting the values or clearing the rows fails.
+    """
+    if not self.row_counts:
+      await self.post_queued_values()
+      return
+
+    # Fetch the sheet IDs while the values are posted
+    _, sheet_ids = await asyncio.gather(self.post_queued_values(), self.get_sheet_ids())
+
+    try:
+      await self.clear_extra_rows(sheet_ids=sheet_ids)
+    except HTTPException as e:
+      if "No grid with id" not in str(e.detail):
+        raise
+
+      # A sheet ID is rejected if its sheet was replaced since the IDs were fetched, so fetch the
+      # IDs again once
+      await self.clear_extra_rows(sheet_ids=await self.get_sheet_ids(refresh=True))
+
+    self.row_counts = {}
+    print("Cleared extra data rows.")
+
+  async def post_queued_values(self) -> None:
+    if self.value_ranges:
+      await sheets_services.batch_post_values(
+        value_ranges=self.value_ranges, spreadsheet_id=self.spreadsheet_id,
+      )
+      self.value_ranges = []
+
+  async def get_sheet_ids(self, refresh: bool = False) -> Dict[str, int]:
+    if (
+      refresh
+      or self.sheet_ids is None
+      or any(sheet_name not in self.sheet_ids for sheet_name in self.row_counts)
+    ):
+      self.sheet_ids = await sheets_services.get_sheet_ids(spreadsheet_id=self.spreadsheet_id)
+
+    return self.sheet_ids
+
+  async def clear_extra_rows(self, sheet_ids: Dict[str, int]) -> None:
+    missing_sheets = [sheet_name for sheet_name in self.row_counts if sheet_name not in sheet_ids]
+    if missing_sheets:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Sheet with this name does not exist in spreadsheet.",
+      )
+
+    # Set the row count of each sheet to its last posted row (deleting all rows after it)
+    await sheets_services.update_spreadsheet(
+      spreadsheet_id=self.spreadsheet_id,
+      requests=[
+        {
+          "updateSheetProperties": {
+            "properties": {"sheetId": sheet_ids[sheet_name], "gridProperties": {"rowCount": row_count}},
+            "fields": "gridProperties.rowCount",
+          }
+        }
+        for sheet_name, row_count in self.row_counts.items()
+      ],
+    )
+
+async def append_row_dicts_to_spreadsheet(
+  ss_properties: SheetProperties,
+  row_dicts: List[Dict[str, Any]],
+) -> None:
+  """
+  Append a List of row dictionaries after the last row of a Google Sheets spreadsheet.
+
+  Keeps all existing rows of the sheet and only reads its header row, so the values are placed in
+  the columns of their headers (in the order of the sheet, not of the required headers). Headers
+  missing from a row dict are left empty.
+
+  Raises:
+    HTTPException: If the required headers are not found in the header row of the sheet.
+  """
+  if not row_dicts:
+    return
+
+  # Get the header row and validate it contains all required values
+  header_values: List[List[Any]] = await sheets_services.get_values(
+    spreadsheet_id=ss_properties.id, sheet_name=ss_properties.sheet_name, cell_range="1:1",
+  )
+  actual_headers: List[str] = header_values[0]
+
+  validate_required_headers_(
+    actual_headers=actual_headers,
+    required_headers=ss_properties.required_headers,
+    sheet_name=ss_properties.sheet_name,
+  )
+
+  await sheets_services.append_values(
+    values=row_dicts_to_lists(header_row=actual_headers, row_dicts=row_dicts),
+    spreadsheet_id=ss_properties.id,
+    sheet_name=ss_properties.sheet_name,
+  )
 
 def index_to_column_letter(index: int) -> str:
   letters: str = ""
   while index > 0:
     letters = chr(index % 26 + ord("A")) + letters
     index = index // 26
-  return letters
\ No newline at end of file
+  return letters
+
+def create_row_frame(
+  required_headers: List[str],
+  actual_headers: List[str],
+  rows: List[List[Any]],
+) -> DataFrame:
+  """
+  Convert rows of data into a DataFrame with the required headers as columns.
+
+  Works like `create_row_dicts`, but only the values of the required headers are taken from each
+  row (missing values are filled with empty strings), without creating a dictionary per row.
+  """
+  hdr_pos: List[int] = [actual_headers.index(hdr) for hdr in required_headers]
+
+  return DataFrame.from_records(
+    ([row[pos] if pos < len(row) else "" for pos in hdr_pos] for row in rows),
+    columns=required_headers,
+  )
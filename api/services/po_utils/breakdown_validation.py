@@ -1,4 +1,4 @@
-from typing import List, Any
+from typing import Set
 from pydantic import BaseModel
 from fastapi import HTTPException
 
@@ -6,12 +6,13 @@ from api.models.sheets import WorksheetPropertiesNonAts, ValidationProperties, S
 from api.models.purchase_orders import UpdatePurchaseOrder, Log
 from api.crud.purchase_orders import get_purchase_order, update_purchase_order, add_log_to_purchase_order
 from api.services.google_api import sheets_utils
-from api.services.cached_data.item_types import get_updated_item_types_rows
+from api.services.po_utils import validation_engine
+from api.services.cached_data.item_types import get_updated_item_types_by_name
 from api.services.utils.send_emails import send_error_email
 
 class ValidationData(BaseModel):
-  brands: List[str]
-  general_types: List[str]
+  brands: Set[str]
+  general_types: Set[str]
 
 async def validate_worksheet_for_breakdown(po_id: int) -> SheetValues | None:
   """
@@ -29,9 +30,14 @@ async def validate_worksheet_for_breakdown(po_id: int) -> SheetValues | None:
     if worksheet_id is None:
       raise Exception("Could not find spreadsheet associated with this purchase order.")
 
+    # Fetch the worksheet and validation sheets with one request
+    snapshot = await sheets_utils.load_spreadsheet_snapshot(ss_properties_list=[
+      WorksheetPropertiesNonAts(id=worksheet_id), ValidationProperties(id=worksheet_id),
+    ])
+
     # Retrieve values from the worksheet.
     try:
-      worksheet_values = await sheets_utils.get_row_dicts_from_spreadsheet(
+      worksheet_values = snapshot.get_row_dicts(
         ss_properties=WorksheetPropertiesNonAts(id=worksheet_id)
       )
     except HTTPException as e:
@@ -52,55 +58,62 @@ async def validate_worksheet_for_breakdown(po_id: int) -> SheetValues | None:
 
     worksheet_row_dicts = worksheet_values.row_dicts
 
-    validation_data = await get_validation_data(worksheet_id=worksheet_id)
+    validation_data = get_validation_data(snapshot=snapshot)
 
-    has_errors = False
+    # Retrieve the item types (keyed by ProductTypeName) once for all rows
+    item_types_by_name = get_updated_item_types_by_name()
 
-    # Validate each row in worksheet
-    for row in worksheet_row_dicts:
-      error_msgs: List[str] = []
+    # Validate all rows in worksheet at once
+    worksheet = validation_engine.create_validation_frame(row_dicts=worksheet_row_dicts)
+    item_types = validation_engine.get_text(frame=worksheet, column="Item Type")
+    is_general_type = item_types.isin(validation_data.general_types)
+    is_known_type = item_types.isin(item_types_by_name)
 
+    errors = [
       # validate brand
-      brand: str = row["Brand"]
-      if brand not in validation_data.brands:
-        error_msgs.append("Invalid Brand")
-
+      validation_engine.first_error(
+        frame=worksheet, checks=[(~worksheet["Brand"].isin(validation_data.brands), "Invalid Brand")],
+      ),
       # validate item type
-      item_type: str = row["Item Type"]
-      if item_type not in validation_data.general_types:
-        error_msgs.append("Invalid Type")
-      else:
-        item_types_rows = get_updated_item_types_rows()
-        item_type_data = next(
-          (item_row for item_row in item_types_rows.row_dicts
-          if item_row["ProductTypeName"] == item_type),
-          None
+      validation_engine.first_error(
+        frame=worksheet,
+        checks=[(~is_general_type, "Invalid Type"), (~is_known_type, "Unknown Type")],
+      ),
+    ]
+
+    # validate retail, unit cost, and qty
+    for column in ["Retail", "Unit Cost", "Qty"]:
+      numbers = validation_engine.get_numbers(frame=worksheet, column=column)
+      errors.append(
+        validation_engine.first_error(
+          frame=worksheet,
+          checks=[
+            (numbers.isna(), f"{column} requires a number"),
+            (numbers <= 0, f"{column} must be greater than zero"),
+          ],
         )
-        if item_type_data is None:
-          error_msgs.append("Unknown Type")
-        else:
-          row["Category"] = item_type_data.get("Reporting Category", "")
-          row["Gender"] = item_type_data.get("Gender", "")
-
-      # validate retail, unit cost, and qty
-      for column in ["Retail", "Unit Cost", "Qty"]:
-        value = row[column]
-        if is_valid_float(value=value):
-          num = float(value)
-          if num <= 0:
-            error_msgs.append(f"{column} must be greater than zero")
-        else:
-          error_msgs.append(f"{column} requires a number")
-
-      # validate grade
-      grade: str = row["Grade"]
-      if not grade:
-        error_msgs.append("Invalid Grade")
-        
-      row["Errors"] = ". ".join(error_msgs)
+      )
 
-      if error_msgs:
-        has_errors = True
+    # validate grade
+    errors.append(
+      validation_engine.first_error(
+        frame=worksheet, checks=[(~worksheet["Grade"].astype(bool), "Invalid Grade")],
+      )
+    )
+
+    has_errors = validation_engine.set_errors(
+      row_dicts=worksheet_row_dicts,
+      errors=validation_engine.join_errors(frame=worksheet, errors=errors),
+    )
+
+    # Add category and gender of the item type to the rows with a known type
+    for row, has_item_type_data in zip(
+      worksheet_row_dicts, (is_general_type & is_known_type).tolist(),
+    ):
+      if has_item_type_data:
+        item_type_data = item_types_by_name[row["Item Type"]]
+        row["Category"] = item_type_data.get("Reporting Category", "")
+        row["Gender"] = item_type_data.get("Gender", "")
 
     if has_errors:
       await sheets_utils.post_row_dicts_to_spreadsheet(
@@ -132,10 +145,10 @@ async def validate_worksheet_for_breakdown(po_id: int) -> SheetValues | None:
 
     await send_error_email(subject=f"PO #{po_id} Breakdown Error", error_message=str(e))
 
-async def get_validation_data(worksheet_id: str) -> ValidationData:
+def get_validation_data(snapshot: sheets_utils.SpreadsheetSnapshot) -> ValidationData:
   # Retrieve validation data from validation sheet in PO worksheet.
-  validation_values = await sheets_utils.get_row_dicts_from_spreadsheet(
-    ss_properties=ValidationProperties(id=worksheet_id)
+  validation_values = snapshot.get_row_dicts(
+    ss_properties=ValidationProperties(id=snapshot.spreadsheet_id)
   )
   validation_row_dicts = validation_values.row_dicts
 
@@ -151,12 +164,4 @@ async def get_validation_data(worksheet_id: str) -> ValidationData:
     if general_type:
       general_types.add(general_type)
 
-  return ValidationData(brands=list(brands), general_types=list(general_types))
-
-def is_valid_float(value: Any) -> bool:
-  try:
-    float(value)
-    return True
-  except ValueError:
-    return False
-
+  return ValidationData(brands=brands, general_types=general_types)
@@ -4,8 +4,7 @@ from fastapi import  HTTPException, status
 from api.services.po_utils.net_sales_validation import validate_for_net_sales
 from api.crud.settings import get_breakdown_net_sales_settings
 from api.crud.purchase_orders import update_purchase_order, add_log_to_purchase_order, get_purchase_order
-from api.services.google_api.sheets_utils import post_row_dicts_to_spreadsheet, get_row_dicts_from_spreadsheet
-from api.services.google_api.sheets import post_values
+from api.services.google_api.sheets_utils import SpreadsheetWriteSession, load_spreadsheet_snapshot
 from api.services.utils.send_emails import send_error_email
 from api.models.purchase_orders import Log, UpdatePurchaseOrder
 from api.models.sheets import BreakdownProperties, WorksheetPropertiesNonAts, RowDicts, ValidationProperties
@@ -31,13 +30,18 @@ async def calculate_net_sales(po_id: int):
       update_purchase_order(id=po.id, updates=UpdatePurchaseOrder(status="Internal Error"))
       return
 
-    worksheet_values = await get_row_dicts_from_spreadsheet(
-      ss_properties=WorksheetPropertiesNonAts(id=spreadsheet_id),
-    )
+    # Fetch the Worksheet, Breakdown, and Validation sheets with one request
+    snapshot = await load_spreadsheet_snapshot(ss_properties_list=[
+      WorksheetPropertiesNonAts(id=spreadsheet_id),
+      BreakdownProperties(id=spreadsheet_id),
+      ValidationProperties(id=spreadsheet_id),
+    ])
+
+    worksheet_values = snapshot.get_row_dicts(ss_properties=WorksheetPropertiesNonAts(id=spreadsheet_id))
 
     breakdown_values = await validate_for_net_sales(
       po=po, current_settings=current_settings,
-      worksheet_rows=worksheet_values, spreadsheet_id=spreadsheet_id
+      worksheet_rows=worksheet_values, snapshot=snapshot,
     )
     if breakdown_values is None:
       return
@@ -64,38 +68,38 @@ async def calculate_net_sales(po_id: int):
       products_cost=products_cost, total_cost=total_cost, worksheet_rows=worksheet_values
     )
 
-    await post_row_dicts_to_spreadsheet(
+    # Post the Breakdown, Worksheet, and Item Type validations together
+    write_session = SpreadsheetWriteSession(spreadsheet_id=spreadsheet_id)
+
+    write_session.post_row_dicts(
       ss_properties=BreakdownProperties(id=spreadsheet_id),
       row_dicts=breakdown_values.row_dicts,
     )
 
-    await post_row_dicts_to_spreadsheet(
+    write_session.post_row_dicts(
       ss_properties=WorksheetPropertiesNonAts(id=spreadsheet_id),
       row_dicts=worksheet_values.row_dicts,
     )
 
-    add_log_to_purchase_order(
-      id=po_id, log=Log(user="Internal", message="Posted Net Sales.", type="log"),
-    )
-
-    update_purchase_order(id=po_id, updates=UpdatePurchaseOrder(status="Net Sales Calculated"))
-
     add_log_to_purchase_order(
       id=po_id, log=Log(user="Internal", message="Changing Item Type validations.", type="log"),
     )
 
-    validation_rows = await get_row_dicts_from_spreadsheet(
-      ss_properties=ValidationProperties(id=spreadsheet_id),
-    )
+    validation_rows = snapshot.get_row_dicts(ss_properties=ValidationProperties(id=spreadsheet_id))
 
     types_validation = [[row["ProductTypeName"]] for row in validation_rows.row_dicts]
     cell_range = f"G2:G{len(types_validation) + 1}"
 
-    await post_values(
-      values=types_validation, spreadsheet_id=spreadsheet_id,
-      sheet_name="Validation", cell_range=cell_range,
+    write_session.post_values(sheet_name="Validation", values=types_validation, cell_range=cell_range)
+
+    await write_session.commit()
+
+    add_log_to_purchase_order(
+      id=po_id, log=Log(user="Internal", message="Posted Net Sales.", type="log"),
     )
 
+    update_purchase_order(id=po_id, updates=UpdatePurchaseOrder(status="Net Sales Calculated"))
+
   except Exception as e:
     add_log_to_purchase_order(
       id=po_id, log=Log(user="Internal", message=str(e), type="error")
@@ -2,7 +2,9 @@ from typing import List, Dict, Any, Set
 import asyncio
 from fastapi import HTTPException, status
 
-from api.services.utils.get_aliases_dicts import get_aliases_dicts
+from api.services.cached_data.aliases import (
+  get_updated_aliases_dicts, reserve_parent_sku_numbers, append_created_skus,
+)
 from api.crud.purchase_orders import add_log_to_purchase_order, update_purchase_order
 from api.services.utils.mpn_formatter import remove_special_chars, format_mpn
 from api.crud.settings import get_ats_settings, update_ats_settings, get_ebay_discount_settings
@@ -76,7 +78,10 @@ async def create_or_find_skus(
     row_dicts=worksheet_values.row_dicts,
   )
 
-  # Post new products to Aliases/Created SKUs sheet
+  # Post new products to Aliases/Created SKUs sheet (and add them to the cached aliases index).
+  # ATS SKUs are numbered by the ATS settings and are not listed there.
+  if not is_ats:
+    await append_created_skus(rows=new_sku_data)
 
   is_job_completed = await wait_for_job_to_finish(po_id=po_id, job_id=sc_job_id, token=sc_token)
 
@@ -132,9 +137,10 @@ async def create_or_find_skus_non_ats(
     id=po_id, log=Log(user="Internal", message="Assigning SKUs.", type="log"),
   )
   
-  aliases_dicts = await get_aliases_dicts()
+  aliases_dicts = get_updated_aliases_dicts()
   brand_mpn_dict = aliases_dicts["brand_mpn_dict"]
-  brand_type_dict = aliases_dicts["brand_type_dict"]
+  # The rows that need a new parent SKU, by brand-type prefix
+  new_parent_rows: Dict[str, List[Dict[str, Any]]] = {}
 
   # Assign SKUs for all rows without SKUs
   for row in worksheet_values.row_dicts:
@@ -145,17 +151,22 @@ async def create_or_find_skus_non_ats(
       if brand_mpn in brand_mpn_dict:
         row["existing_skus"] = brand_mpn_dict[brand_mpn]
         row["parent_sku"] = get_parent_from_sku(sku=row["existing_skus"][0])
-      elif brand_type in brand_type_dict:
-        highest_existing_parent_sku_number = get_highest_number_from_list_of_skus(
-          skus=brand_type_dict[brand_type]
-        )
-        new_sku_number = highest_existing_parent_sku_number + 1
-        row["parent_sku"] = brand_type + "-" + pad_sku_number(sku=str(new_sku_number), zeros=4)
-        brand_type_dict[brand_type].append(row["parent_sku"])
       else:
-        row["parent_sku"] = brand_type + "-0001"
-        brand_type_dict[brand_type] = [row["parent_sku"]]
+        new_parent_rows.setdefault(brand_type, []).append(row)
+
+  # Reserve the new parent SKU numbers before the SKUs are uploaded (the first parent SKU of a new
+  # brand-type prefix is numbered 0001)
+  first_numbers = reserve_parent_sku_numbers(
+    brand_type_counts={brand_type: len(rows) for brand_type, rows in new_parent_rows.items()},
+  )
 
+  for brand_type, rows in new_parent_rows.items():
+    for offset, row in enumerate(rows):
+      new_sku_number = first_numbers[brand_type] + offset
+      row["parent_sku"] = brand_type + "-" + pad_sku_number(sku=str(new_sku_number), zeros=4)
+
+  for row in worksheet_values.row_dicts:
+    if not row["ProductID"]:
       row["new_sku"] = row["parent_sku"] + "/" + str(row["Size"])
 
   new_skus: List[str] = []
@@ -189,20 +200,6 @@ async def create_or_find_skus_non_ats(
 def get_parent_from_sku(sku: str) -> str:
   return sku.split("/")[0]
 
-def get_sku_number(sku: str) -> int:
-  parent = sku.split("/")[0]
-  num_string = parent.split("-")[2]
-  return int(num_string)
-
-def get_highest_number_from_list_of_skus(skus: List[str]) -> int:
-  all_numbers: List[int] = []
-
-  for sku in skus:
-    sku_number = get_sku_number(sku=sku)
-    all_numbers.append(sku_number)
-
-  return max(all_numbers)
-
 def pad_sku_number(sku: str, zeros: int) -> str:
   return sku.zfill(zeros)
 
@@ -1,23 +1,28 @@
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Tuple
 from fastapi import HTTPException
+from pandas import DataFrame, Series
 
 from api.services.cached_data.brand_codes import get_updated_brand_codes
 from api.services.cached_data.item_type_acronyms import get_updated_item_type_acronyms
 from api.services.cached_data.valid_sizes import get_updated_valid_sizes
-from api.services.google_api.sheets_utils import get_row_dicts_from_spreadsheet, post_row_dicts_to_spreadsheet
+from api.services.google_api.sheets_utils import SpreadsheetSnapshot, post_row_dicts_to_spreadsheet
 from api.crud.purchase_orders import add_log_to_purchase_order
-from api.services.utils.mpn_formatter import remove_special_chars
+from api.services.po_utils import validation_engine
 from api.models.sheets import SheetValues, WorksheetPropertiesNonAts, WorksheetPropertiesAts, BreakdownProperties
 from api.models.purchase_orders import Log
 
-async def validate_worksheet_for_po_non_ats(spreadsheet_id: str, po_id: int) -> SheetValues | None:
+async def validate_worksheet_for_po_non_ats(
+  snapshot: SpreadsheetSnapshot, po_id: int,
+) -> SheetValues | None:
+  spreadsheet_id = snapshot.spreadsheet_id
+
   add_log_to_purchase_order(
     id=po_id, log=Log(user="Internal", message="Validating Worksheet data for PO.", type="log"),
   )
 
   # Retrieve values from worksheet sheet (with exception for empty worksheet)
   try:
-    worksheet_values = await get_row_dicts_from_spreadsheet(
+    worksheet_values = snapshot.get_row_dicts(
       ss_properties=WorksheetPropertiesNonAts(id=spreadsheet_id),
     )
   except HTTPException as e:
@@ -31,111 +36,43 @@ async def validate_worksheet_for_po_non_ats(spreadsheet_id: str, po_id: int) ->
     else:
       raise
 
-  # If there are rows without SKUs
-  has_new_skus = not all(row["ProductID"] for row in worksheet_values.row_dicts)
-  if has_new_skus:
+  # Load the worksheet rows into a frame, so every rule is checked for all rows at once
+  worksheet = validation_engine.create_validation_frame(row_dicts=worksheet_values.row_dicts)
+  errors: List[Series] = []
+
+  # Validation for rows that do not have a SKU
+  is_new_sku = validation_engine.get_text(frame=worksheet, column="ProductID") == ""
+  if is_new_sku.any():
     # Retrieve brand codes, item type codes, and valid sizes from cache
     brand_codes = get_updated_brand_codes()
     item_type_acronyms = get_updated_item_type_acronyms()
     valid_sizes = get_updated_valid_sizes()
 
-    # Create a dict of all mpns and their product colors in the worksheet
-    mpn_color_dict: Dict[str, Set[str]] = {}
-    for row in worksheet_values.row_dicts:
-      if row["MPN"] not in mpn_color_dict:
-        mpn_color_dict[row["MPN"]] = set()
-      mpn_color_dict[row["MPN"]].add(row["Color"])
-
-    # Create a dict of all brand-mpns and their description and item types
-    brand_mpn_description_item_type: Dict[str, Dict[str, str]] = {}
-    for row in worksheet_values.row_dicts:
-      brand_mpn_description_item_type[row["Brand"] + remove_special_chars(mpn=row["MPN"])] = {
-        "description": row["Description"],
-        "item_type": row["Item Type"],
-      }
-
-  # initialize a variable (is there any errors in the entire worksheet?)
-  has_errors = False
-
-  # Validate all rows in the worksheet
-  for row in worksheet_values.row_dicts:
-    # Initialize a list of error messages for current row
-    error_msgs: List[str] = []
-
-    # Validation for rows that do not have a SKU
-    if not row["ProductID"]:
-      # Validate brand
-      error_msgs.append(
-        validate_brand(
-          brand=str(row["Brand"]), is_ats=False, brand_codes=brand_codes # type: ignore
-        )
-      )
-
-      # Retrieve matching data for current row brand+mpn
-      mpn_removed_chars = remove_special_chars(mpn=row["MPN"])
-      matching_row_data = brand_mpn_description_item_type[row["Brand"] + mpn_removed_chars] # type: ignore
-      
-      # Validate description
-      error_msgs.append(
-        validate_description(
-          description=str(row["Description"]),
-          matching_description=matching_row_data["description"], # type: ignore
-        )
-      )
-
-      # Validate item type
-      error_msgs.append(
-        validate_item_type(
-          item_type=str(row["Item Type"]), is_ats=False,
-          matching_item_type=matching_row_data["item_type"], # type: ignore
-          item_types=item_type_acronyms, # type: ignore
-        )
-      )
-
-      # Validate color
-      error_msgs.append(
-        validate_color(color=row["Color"], mpn_colors=mpn_color_dict[row["MPN"]]) # type: ignore
-      )
-      
-      # Validate size
-      error_msgs.append(
-        validate_size(
-          size=str(row["Size"]), is_ats=False,
-          valid_sizes=valid_sizes,  # type: ignore
-        )
+    errors.extend(
+      validation_engine.only_where(errors=product_errors, mask=is_new_sku)
+      for product_errors in validate_product_data(
+        worksheet=worksheet, is_ats=False, brand_codes=brand_codes,
+        item_types=item_type_acronyms, valid_sizes=valid_sizes,
       )
+    )
 
-      # Validate MPN
-      error_msgs.append(validate_mpn(mpn=str(row["MPN"])))
-      
-      # Validate msrp
-      error_msgs.append(validate_retail(retail=str(row["Retail"])))
-
-    # Validation for all rows (including ones that already have a SKU)
-
-    # Validate unit cost
-    error_msgs.append(validate_unit_cost(unit_cost=str(row["Unit Cost"])))
-    
-    # Validate qty
-    error_msgs.append(validate_qty(qty=str(row["Qty"])))
-
-    # Validate unit cost (usd)
-    error_msgs.append(validate_unit_cost(unit_cost=str(row["Unit Cost (USD)"]), usd=True))
-    
-    # Validate weighted cost
-    error_msgs.append(validate_weighted_cost(weighted_cost=str(row["Weighted Cost"])))
-    
-    # Validate group
-    error_msgs.append(validate_group(group=str(row["Group"])))
-
-    # Post updated error messages to errors column
-    error_msg_string = ". ".join(msg for msg in error_msgs if msg)
-    row["Errors"] = error_msg_string
+  # Validation for all rows (including ones that already have a SKU)
+  errors.extend([
+    validation_engine.check_positive_number(frame=worksheet, column="Unit Cost"),
+    validation_engine.check_positive_number(frame=worksheet, column="Qty", integer=True),
+    validation_engine.check_positive_number(frame=worksheet, column="Unit Cost (USD)"),
+    validation_engine.check_positive_number(frame=worksheet, column="Weighted Cost"),
+    validation_engine.check_required(frame=worksheet, column="Group"),
+  ])
+
+  # Post error messages to the errors column of all rows
+  has_errors = validation_engine.set_errors(
+    row_dicts=worksheet_values.row_dicts,
+    errors=validation_engine.join_errors(frame=worksheet, errors=errors),
+  )
 
-    # If there are errors in current row
-    if error_msg_string:
-      has_errors = True # change has_errors (entire sheet) to True
-    else:
+  if not has_errors:
+    for row in worksheet_values.row_dicts:
       if not row["ProductID"]:
         # add brand and type code to rows for use when creating SKUs
         row["Brand Code"] = brand_codes[row["Brand"]] # type: ignore
@@ -144,8 +81,8 @@ async def validate_worksheet_for_po_non_ats(spreadsheet_id: str, po_id: int) ->
   # If there are no errors so-far in the worksheet
   if not has_errors:
     # Validate group data matches data in breakdown sheet
-    has_errors = await validate_group_totals(
-      spreadsheet_id=spreadsheet_id, worksheet_values=worksheet_values,
+    has_errors = validate_group_totals(
+      snapshot=snapshot, worksheet_values=worksheet_values,
     )
 
   # If there are any errors in the worksheet
@@ -167,14 +104,18 @@ async def validate_worksheet_for_po_non_ats(spreadsheet_id: str, po_id: int) ->
   else:
     return worksheet_values # Return updated worksheet values for SKU creation
   
-async def validate_worksheet_for_po_ats(spreadsheet_id: str, po_id: int) -> SheetValues | None:
+async def validate_worksheet_for_po_ats(
+  snapshot: SpreadsheetSnapshot, po_id: int,
+) -> SheetValues | None:
+  spreadsheet_id = snapshot.spreadsheet_id
+
   add_log_to_purchase_order(
     id=po_id, log=Log(user="Internal", message="Validating Worksheet data for PO.", type="log"),
   )
 
   # Retrieve worksheet values (with exception for empty worksheet)
   try:
-    worksheet_values = await get_row_dicts_from_spreadsheet(
+    worksheet_values = snapshot.get_row_dicts(
       ss_properties=WorksheetPropertiesAts(id=spreadsheet_id),
     )
   except HTTPException as e:
@@ -188,74 +129,19 @@ async def validate_worksheet_for_po_ats(spreadsheet_id: str, po_id: int) -> Shee
     else:
       raise
 
-  # Create dict of mpns and their colors in the worksheet
-  mpn_color_dict: Dict[str, Set[str]] = {}
-  for row in worksheet_values.row_dicts:
-    if row["MPN"] not in mpn_color_dict:
-      mpn_color_dict[row["MPN"]] = set()
-    mpn_color_dict[row["MPN"]].add(row["Color"])
-
-  # Create dict of mpns and their description and item types
-  mpn_description_item_type: Dict[str, Dict[str, str]] = {}
-  for row in worksheet_values.row_dicts:
-    mpn_description_item_type[remove_special_chars(mpn=row["MPN"])] = {
-      "description": row["Description"],
-      "item_type": row["Item Type"],
-    }
-
-  # Initialize has_errors variable (are there any errors in entire worksheet?)
-  has_errors = False
-
-  for row in worksheet_values.row_dicts:
-    error_msgs: List[str] = []
-
-    # Validate brand
-    error_msgs.append(validate_brand(brand=str(row["Brand"]), is_ats=True))
-
-    mpn_removed_chars = remove_special_chars(mpn=row["MPN"])
-    matching_row_data = mpn_description_item_type[mpn_removed_chars]
-      
-    # Validate description
-    error_msgs.append(
-      validate_description(
-        description=str(row["Description"]), matching_description=matching_row_data["description"],
-      )
-    )
-
-    # Validate item type
-    error_msgs.append(
-      validate_item_type(
-        item_type=str(row["Item Type"]), is_ats=True,
-        matching_item_type=matching_row_data["item_type"],
-      )
-    )
-
-    # Validate color
-    error_msgs.append(
-      validate_color(color=row["Color"], mpn_colors=mpn_color_dict[row["MPN"]])
-    )
-      
-    # Validate size
-    error_msgs.append(validate_size(size=str(row["Size"]), is_ats=True))
-
-    # Validate mpn
-    error_msgs.append(validate_mpn(mpn=str(row["MPN"])))
-      
-    # Validate msrp
-    error_msgs.append(validate_retail(retail=str(row["Retail"])))
-
-    # Validate unit cost
-    error_msgs.append(validate_unit_cost(unit_cost=str(row["Unit Cost"])))
-    
-    # Validate qty
-    error_msgs.append(validate_qty(qty=str(row["Qty"])))
-
-    # Post final error messages to Errors column of current row
-    error_msg_string = ". ".join(msg for msg in error_msgs if msg)
-    row["Errors"] = error_msg_string
-
-    if error_msg_string:
-      has_errors = True
+  # Validate all rows in the worksheet at once
+  worksheet = validation_engine.create_validation_frame(row_dicts=worksheet_values.row_dicts)
+  errors = validate_product_data(worksheet=worksheet, is_ats=True)
+  errors.extend([
+    validation_engine.check_positive_number(frame=worksheet, column="Unit Cost"),
+    validation_engine.check_positive_number(frame=worksheet, column="Qty", integer=True),
+  ])
+
+  # Post final error messages to Errors column of all rows
+  has_errors = validation_engine.set_errors(
+    row_dicts=worksheet_values.row_dicts,
+    errors=validation_engine.join_errors(frame=worksheet, errors=errors),
+  )
 
   # If there are any errors in entire worksheet
   if has_errors:
@@ -276,147 +162,108 @@ async def validate_worksheet_for_po_ats(spreadsheet_id: str, po_id: int) -> Shee
   else:
     return worksheet_values # Return worksheet values for SKU creation
 
-def validate_brand(brand: str, is_ats: bool, brand_codes: Dict[str, str] = {}) -> str:
-  if not brand:
-    return "Missing Brand"
-  elif not is_ats and brand not in brand_codes:
-    return "Invalid Brand"
-  return ""
-
-def validate_description(description: str, matching_description: str) -> str:
-  if not description:
-    return "Missing Description"
-  elif description != matching_description:
-    return "Different description found for same Brand & MPN on this sheet"
-  return ""
-
-def validate_item_type(
-  item_type: str, is_ats: bool, matching_item_type: str, item_types: Dict[str, str] = {},
-) -> str:
-  if not item_type:
-    return "Missing Item Type"
-  elif not is_ats and item_type not in item_types:
-    return "Invalid Item Type"
-  elif item_type != matching_item_type:
-    return "Different item type found for same Brand & MPN on this sheet"
-  return ""
-
-def validate_color(color: str, mpn_colors: Set[str]) -> str:
-  if not color:
-    return "Missing Color"
-  elif len(mpn_colors) > 1:
-    return "This MPN has more than one color assigned in this sheet"
-  return ""
-
-def validate_size(size: str, is_ats: bool, valid_sizes: Set[str] = set()) -> str:
-  if not size:
-    return "Missing Size"
-  elif not is_ats and size not in valid_sizes:
-    return "Invalid Size"
-  return ""
-
-def validate_mpn(mpn: str) -> str:
-  return "" if mpn else "Missing MPN"
-
-def validate_retail(retail: str) -> str:
-  if not retail:
-    return "Missing Retail"
-  else:
-    try:
-      msrp = float(retail)
-      if msrp <= 0:
-        raise ValueError
-    except ValueError:
-      return "Retail is not a valid number"
-  return ""
-
-def validate_unit_cost(unit_cost: str, usd: bool = False) -> str:
-  col_name = " (USD)" if usd else ""
-  if not unit_cost:
-    return f"Missing Unit Cost{col_name}"
-  else:
-    try:
-      cost = float(unit_cost)
-      if cost <= 0:
-        raise ValueError
-    except ValueError:
-      return f"Unit Cost{col_name} is not a valid number"
-  return ""
-
-def validate_weighted_cost(weighted_cost: str) -> str:
-  if not weighted_cost:
-    return "Missing Weighted Cost"
-  else:
-    try:
-      cost = float(weighted_cost)
-      if cost <= 0:
-        raise ValueError
-    except ValueError:
-      return "Weighted Cost is not a valid number"
-  return ""
-
-def validate_qty(qty: str) -> str:
-  if not qty:
-    return "Missing Qty"
-  else:
-    try:
-      quantity = int(qty)
-      if quantity <= 0:
-        raise ValueError
-    except ValueError:
-      return "Qty is not a valid number"
-  return ""
-
-def validate_group(group: str) -> str:
-  return "" if group else "Missing Group"
-
-async def validate_group_totals(
-  spreadsheet_id: str, worksheet_values: SheetValues,
+def validate_product_data(
+  worksheet: DataFrame,
+  is_ats: bool,
+  brand_codes: Dict[str, str] = {},
+  item_types: Dict[str, str] = {},
+  valid_sizes: Set[str] = set(),
+) -> List[Series]:
+  """
+  This function validates the product data (brand, description, item type, color, size, mpn, and
+  retail) of all worksheet rows. Brands, item types, and sizes are only checked against the SKU/PO
+  Tool data for non-ATS worksheets. Descriptions and item types must match the last row with the
+  same Brand & MPN (same MPN for ATS worksheets).
+
+  Returns:
+    List[Series]: The error messages of each rule for all rows.
+  """
+  brands = validation_engine.get_text(frame=worksheet, column="Brand")
+  descriptions = validation_engine.get_text(frame=worksheet, column="Description")
+  worksheet_item_types = validation_engine.get_text(frame=worksheet, column="Item Type")
+  mpns = validation_engine.normalize_mpns(mpns=worksheet["MPN"])
+  brand_mpns = mpns if is_ats else brands + mpns
+
+  item_type_checks: List[Tuple[Series, str]] = [(worksheet_item_types == "", "Missing Item Type")]
+  if not is_ats:
+    item_type_checks.append((~worksheet_item_types.isin(item_types), "Invalid Item Type"))
+  item_type_checks.append((
+    validation_engine.differs_from_last_in_group(values=worksheet["Item Type"], keys=brand_mpns),
+    "Different item type found for same Brand & MPN on this sheet",
+  ))
+
+  return [
+    # Validate brand
+    validation_engine.check_required(frame=worksheet, column="Brand") if is_ats
+    else validation_engine.check_in_set(frame=worksheet, column="Brand", valid_values=brand_codes),
+    # Validate description
+    validation_engine.first_error(
+      frame=worksheet,
+      checks=[
+        (descriptions == "", "Missing Description"),
+        (
+          validation_engine.differs_from_last_in_group(
+            values=worksheet["Description"], keys=brand_mpns,
+          ),
+          "Different description found for same Brand & MPN on this sheet",
+        ),
+      ],
+    ),
+    # Validate item type
+    validation_engine.first_error(frame=worksheet, checks=item_type_checks),
+    # Validate color
+    validation_engine.first_error(
+      frame=worksheet,
+      checks=[
+        (~worksheet["Color"].astype(bool), "Missing Color"),
+        (
+          validation_engine.has_multiple_values_in_group(
+            values=worksheet["Color"], keys=worksheet["MPN"],
+          ),
+          "This MPN has more than one color assigned in this sheet",
+        ),
+      ],
+    ),
+    # Validate size
+    validation_engine.check_required(frame=worksheet, column="Size") if is_ats
+    else validation_engine.check_in_set(frame=worksheet, column="Size", valid_values=valid_sizes),
+    # Validate MPN
+    validation_engine.check_required(frame=worksheet, column="MPN"),
+    # Validate msrp
+    validation_engine.check_positive_number(frame=worksheet, column="Retail"),
+  ]
+
+def validate_group_totals(
+  snapshot: SpreadsheetSnapshot, worksheet_values: SheetValues,
 ) -> bool:
   has_errors: bool = False
 
   # Validate that the groups and numbers (cost & msrp) match the breakdown sheet
-  
-  # Create set of groups in worksheet
-  worksheet_groups = set([row["Group"] for row in worksheet_values.row_dicts])
 
-  # Create dict of cost, msrp, and weighted cost totals for worksheet groups
+  # Create dict of cost, msrp, and weighted cost totals for worksheet groups (in one pass over the
+  # rows, adding up the rows of each group in worksheet order)
   worksheet_group_totals: Dict[str, Dict[str, float]] = {}
 
-  for group in worksheet_groups:
-    total_cost = sum(
-      float(row["Unit Cost (USD)"]) * int(row["Qty"]) for row in worksheet_values.row_dicts
-      if row["Group"] == group
-    )
-    total_msrp = sum(
-      float(row["Retail"]) * int(row["Qty"]) for row in worksheet_values.row_dicts
-      if row["Group"] == group
-    )
-    total_weighted_cost = sum(
-      float(row["Weighted Cost"]) * int(row["Qty"]) for row in worksheet_values.row_dicts
-      if row["Group"] == group
+  for row in worksheet_values.row_dicts:
+    qty = int(row["Qty"])
+    group_totals = worksheet_group_totals.setdefault(
+      row["Group"], {"cost": 0, "msrp": 0, "weighted_cost": 0},
     )
+    group_totals["cost"] += float(row["Unit Cost (USD)"]) * qty
+    group_totals["msrp"] += float(row["Retail"]) * qty
+    group_totals["weighted_cost"] += float(row["Weighted Cost"]) * qty
 
-    # Add current group totals to group-totals dict
-    worksheet_group_totals[group] = {
-      "cost": total_cost,
-      "msrp": total_msrp,
-      "weighted_cost": total_weighted_cost,
-    }
-
-  # Retrieve breakdown sheet values
-  breakdown_values = await get_row_dicts_from_spreadsheet(
-    ss_properties=BreakdownProperties(id=spreadsheet_id),
+  # Retrieve breakdown sheet values (fetched with the worksheet)
+  breakdown_values = snapshot.get_row_dicts(
+    ss_properties=BreakdownProperties(id=snapshot.spreadsheet_id),
   )
 
-  # Create list of breakdown groups, and a dict of the group totals
-  breakdown_groups: List[str] = []
+  # Create a dict of the breakdown group totals
   breakdown_group_totals: Dict[str, Dict[str, float]] = {}
 
   # Populate the breakdown data from the breakdown rows
   for row in breakdown_values.row_dicts:
     group: str = row["Product Group"]
-    breakdown_groups.append(group)
     breakdown_group_totals[group] = {
       "cost": float(row["Total Cost"]),
       "msrp": float(row["Total MSRP"]),
@@ -429,7 +276,7 @@ async def validate_group_totals(
 
     group = row["Group"]
 
-    if group not in worksheet_groups:
+    if group not in breakdown_group_totals:
       error_msgs.append("Group not found in Breakdown")
     else:
       current_group_totals = worksheet_group_totals[group]
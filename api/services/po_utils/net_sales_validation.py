@@ -1,7 +1,7 @@
 from typing import List, Dict
 
 from api.crud.purchase_orders import add_log_to_purchase_order, update_purchase_order
-from api.services.google_api.sheets_utils import get_row_dicts_from_spreadsheet, post_row_dicts_to_spreadsheet 
+from api.services.google_api.sheets_utils import SpreadsheetSnapshot, post_row_dicts_to_spreadsheet
 from api.services.utils.send_emails import send_error_email
 from api.models.sheets import BreakdownProperties
 from api.models.purchase_orders import Log, UpdatePurchaseOrder, PurchaseOrderOut
@@ -10,12 +10,14 @@ from api.models.settings import BreakdownNetSalesSettings
 
 async def validate_for_net_sales(
   po: PurchaseOrderOut, current_settings: BreakdownNetSalesSettings,
-  worksheet_rows: RowDicts, spreadsheet_id: str,
+  worksheet_rows: RowDicts, snapshot: SpreadsheetSnapshot,
 ) -> SheetValues | None:
   """
   This function validates the data in the worksheet and breakdown sheets of the Purchase Order
   spreadsheet to prepare for calculating the net sales.    
   """
+  spreadsheet_id = snapshot.spreadsheet_id
+
   add_log_to_purchase_order(
     id=po.id, log=Log(user="Internal", message="Validating data for Net Sales.", type="log"),
   )
@@ -36,10 +38,8 @@ async def validate_for_net_sales(
       await send_error_email(subject=f"PO #{po.id} Net Sales Error", error_message=str(e))
       return
 
-    # Get values and rows from Breakdown sheet
-    breakdown_values = await get_row_dicts_from_spreadsheet(
-      ss_properties=BreakdownProperties(id=spreadsheet_id)
-    )
+    # Get values and rows from Breakdown sheet (fetched with the worksheet)
+    breakdown_values = snapshot.get_row_dicts(ss_properties=BreakdownProperties(id=spreadsheet_id))
     breakdown_rows = breakdown_values.row_dicts
 
     add_log_to_purchase_order(
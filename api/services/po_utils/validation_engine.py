@@ -0,0 +1,145 @@
+from typing import Any, Collection, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+# Rules are evaluated for whole worksheet columns at once. Each rule returns a Series with an error
+# message for every row (empty if the row passed the rule), and join_errors combines the messages
+# of all rules into the Errors column.
+
+def create_validation_frame(row_dicts: List[Dict[str, Any]]) -> DataFrame:
+  """
+  Loads worksheet rows into a DataFrame (keeping the cell values as they are) for validation.
+  The columns are created as object columns, so pandas does not convert the values of a column
+  to one type (e.g. integers in a column with floats would become floats).
+  """
+  return DataFrame(row_dicts, dtype=object)
+
+def get_text(frame: DataFrame, column: str) -> Series:
+  """
+  Returns the values of a column as strings (like str() of each cell value).
+  """
+  return frame[column].astype(str)
+
+def get_numbers(frame: DataFrame, column: str) -> Series:
+  """
+  Returns the values of a column as floats (NaN for cells that are not numbers).
+  """
+  return pd.to_numeric(get_text(frame=frame, column=column).str.strip(), errors="coerce")
+
+def is_integer(frame: DataFrame, column: str) -> Series:
+  """
+  Checks which cells of a column are whole numbers without decimals (like int() of a string).
+  """
+  return get_text(frame=frame, column=column).str.fullmatch(r"\s*[+-]?\d+\s*")
+
+def normalize_mpns(mpns: Series) -> Series:
+  """
+  Removes special characters and underscores from MPNs and converts them to uppercase
+  (the column version of mpn_formatter.remove_special_chars).
+  """
+  return mpns.astype(str).str.replace(r"[\W_]+", "", regex=True).str.upper()
+
+def differs_from_last_in_group(values: Series, keys: Series) -> Series:
+  """
+  Checks which rows have a different value than the last row with the same key.
+  """
+  return values != values.groupby(keys, sort=False).transform("last")
+
+def has_multiple_values_in_group(values: Series, keys: Series) -> Series:
+  """
+  Checks which rows share their key with rows that have a different value.
+  """
+  return values.groupby(keys, sort=False).transform("nunique") > 1
+
+def first_error(frame: DataFrame, checks: List[Tuple[Series, str]]) -> Series:
+  """
+  Returns the message of the first failed check of each row (like an if/elif chain).
+
+  Args:
+    frame (DataFrame): The validated rows.
+    checks (List[Tuple[Series, str]]): Pairs of a boolean Series (True where the check failed) and
+                                      the error message of the check.
+  """
+  return Series(
+    np.select(
+      [np.asarray(failed, dtype=bool) for failed, _ in checks],
+      [message for _, message in checks],
+      default="",
+    ),
+    index=frame.index,
+    dtype=object,
+  )
+
+def check_required(frame: DataFrame, column: str) -> Series:
+  return first_error(
+    frame=frame, checks=[(get_text(frame=frame, column=column) == "", f"Missing {column}")],
+  )
+
+def check_in_set(
+  frame: DataFrame, column: str, valid_values: Collection[Any], message: str | None = None,
+) -> Series:
+  """
+  Requires a value in the column, and checks that it is one of the valid values.
+  """
+  values = get_text(frame=frame, column=column)
+  return first_error(
+    frame=frame,
+    checks=[
+      (values == "", f"Missing {column}"),
+      (~values.isin(valid_values), message or f"Invalid {column}"),
+    ],
+  )
+
+def check_positive_number(
+  frame: DataFrame, column: str, invalid_message: str | None = None, integer: bool = False,
+) -> Series:
+  """
+  Requires a value in the column, and checks that it is a number greater than zero (and a whole
+  number if integer is True).
+  """
+  numbers = get_numbers(frame=frame, column=column)
+  is_valid = numbers > 0
+  if integer:
+    is_valid &= is_integer(frame=frame, column=column)
+
+  return first_error(
+    frame=frame,
+    checks=[
+      (get_text(frame=frame, column=column) == "", f"Missing {column}"),
+      (~is_valid, invalid_message or f"{column} is not a valid number"),
+    ],
+  )
+
+def only_where(errors: Series, mask: Series) -> Series:
+  """
+  Keeps the error messages of a rule only for the rows where mask is True.
+  """
+  return errors.where(mask, "")
+
+def join_errors(frame: DataFrame, errors: List[Series]) -> Series:
+  """
+  Joins the error messages of all rules for each row (separated by ". ", skipping empty messages).
+  """
+  joined_errors = Series("", index=frame.index, dtype=object)
+
+  for rule_errors in errors:
+    has_error = rule_errors != ""
+    joined_errors = joined_errors.where(
+      ~has_error,
+      joined_errors.where(joined_errors == "", joined_errors + ". ") + rule_errors,
+    )
+
+  return joined_errors
+
+def set_errors(row_dicts: List[Dict[str, Any]], errors: Series) -> bool:
+  """
+  Writes the joined error messages to the Errors column of the worksheet rows.
+
+  Returns:
+    bool: True if any row has errors.
+  """
+  for row, row_errors in zip(row_dicts, errors.tolist()):
+    row["Errors"] = row_errors
+
+  return bool((errors != "").any())
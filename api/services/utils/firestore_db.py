@@ -0,0 +1,29 @@
+from firebase_admin import credentials, firestore, get_app, initialize_app # type: ignore
+from typing import Any
+import threading
+
+# The Firestore client (created on first use, see get_db)
+db: Any = None
+db_lock = threading.Lock()
+
+def get_db() -> Any:
+  """
+  Returns the Firestore client. The Firebase app is initialized on first use, so importing the
+  API does not read the credentials file or open connections.
+  """
+  global db
+
+  if db is None:
+    with db_lock:
+      if db is None:
+        try:
+          get_app()
+        except ValueError:
+          initialize_app(credential=credentials.Certificate("google-firebase-adminsdk.json"))
+
+        db = firestore.client() # type: ignore
+
+  return db
+
+def get_collection(name: str) -> Any:
+  return get_db().collection(name)
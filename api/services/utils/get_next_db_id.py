@@ -1,17 +1,15 @@
 from fastapi import HTTPException, status
-from firebase_admin import firestore # type: ignore
 from typing import Literal
 import threading
 
-# Create reference to counters collection
-db = firestore.client() # type: ignore
-counter_collection = db.collection("counters")
+from api.services.utils.firestore_db import get_collection
+
 counter_lock = threading.Lock()
 
 def get_next_id(document: Literal["purchase_orders"]) -> str:
   try:
     with counter_lock:
-      counter_ref = counter_collection.document(document)
+      counter_ref = get_collection("counters").document(document)
       counter_doc = counter_ref.get() # type: ignore
 
       if not counter_doc.exists:
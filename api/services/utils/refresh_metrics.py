@@ -0,0 +1,92 @@
+from pandas import DataFrame
+from pydantic import BaseModel
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List
+import time
+import sys
+
+from api.models.cache import RefreshMetrics
+
+# The metrics of the cache refresh running in the current task (None outside of cache refreshes)
+current_refresh_metrics: ContextVar[RefreshMetrics | None] = ContextVar(
+  "current_refresh_metrics", default=None,
+)
+
+@contextmanager
+def measure_phase(phase: str) -> Iterator[None]:
+  """
+  Adds the time spent in the block to the given phase of the running cache refresh. Phases of
+  concurrent requests are summed, so a phase can take longer than the whole refresh.
+  """
+  start_time = time.perf_counter()
+  try:
+    yield
+  finally:
+    refresh_metrics = current_refresh_metrics.get()
+    if refresh_metrics is not None:
+      refresh_metrics.phase_seconds[phase] = (
+        refresh_metrics.phase_seconds.get(phase, 0.0) + time.perf_counter() - start_time
+      )
+
+def record_api_call(cells_fetched: int = 0, bytes_downloaded: int = 0) -> None:
+  refresh_metrics = current_refresh_metrics.get()
+  if refresh_metrics is not None:
+    refresh_metrics.api_calls += 1
+    refresh_metrics.cells_fetched += cells_fetched
+    refresh_metrics.bytes_downloaded += bytes_downloaded
+
+def record_api_retry() -> None:
+  refresh_metrics = current_refresh_metrics.get()
+  if refresh_metrics is not None:
+    refresh_metrics.api_retries += 1
+
+def get_memory_footprint(data: Any) -> int:
+  """
+  Returns the approximate memory used by cached data in bytes (values shared between entries are
+  counted for every entry).
+  """
+  if isinstance(data, DataFrame):
+    return int(data.memory_usage(deep=True).sum())
+  if isinstance(data, BaseModel):
+    return sys.getsizeof(data) + get_memory_footprint(data.__dict__)
+  if isinstance(data, dict):
+    return sys.getsizeof(data) + sum(
+      get_memory_footprint(key) + get_memory_footprint(value)
+      for key, value in data.items() # type: ignore
+    )
+  if isinstance(data, (list, tuple, set, frozenset)):
+    return sys.getsizeof(data) + sum(get_memory_footprint(value) for value in data) # type: ignore
+  return sys.getsizeof(data)
+
+def format_prometheus_metrics(metrics_by_dataset: Dict[str, RefreshMetrics]) -> str:
+  """
+  Formats the refresh metrics of the cached datasets in the Prometheus text exposition format.
+  """
+  lines: List[str] = []
+
+  def add_metric(metric: str, metric_type: str, description: str, attribute: str) -> None:
+    lines.append(f"# HELP po_tool_cache_{metric} {description}")
+    lines.append(f"# TYPE po_tool_cache_{metric} {metric_type}")
+    for name, refresh_metrics in metrics_by_dataset.items():
+      lines.append(f'po_tool_cache_{metric}{{dataset="{name}"}} {getattr(refresh_metrics, attribute)}')
+
+  add_metric("refreshes_total", "counter", "Refreshes of the dataset.", "refresh_count")
+  add_metric("refresh_failures_total", "counter", "Failed refreshes of the dataset.", "failure_count")
+  add_metric("refresh_duration_seconds", "gauge", "Duration of the latest refresh.", "duration_seconds")
+  add_metric("rows", "gauge", "Rows in the dataset.", "row_count")
+  add_metric("memory_bytes", "gauge", "Approximate memory used by the dataset.", "memory_bytes")
+  add_metric("refresh_api_calls", "gauge", "Google API calls of the latest refresh.", "api_calls")
+  add_metric("refresh_api_retries", "gauge", "Google API retries of the latest refresh.", "api_retries")
+  add_metric("refresh_cells_fetched", "gauge", "Sheet cells fetched by the latest refresh.", "cells_fetched")
+  add_metric(
+    "refresh_bytes_downloaded", "gauge", "Bytes downloaded by the latest refresh.", "bytes_downloaded",
+  )
+
+  lines.append("# HELP po_tool_cache_refresh_phase_seconds Time spent in each phase of the latest refresh.")
+  lines.append("# TYPE po_tool_cache_refresh_phase_seconds gauge")
+  for name, refresh_metrics in metrics_by_dataset.items():
+    for phase, seconds in refresh_metrics.phase_seconds.items():
+      lines.append(f'po_tool_cache_refresh_phase_seconds{{dataset="{name}",phase="{phase}"}} {seconds}')
+
+  return "\n".join(lines) + "\n"
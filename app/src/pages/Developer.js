@@ -44,6 +44,12 @@ const Developer = ({ setLoading, addSnackbar }) => {
       width: 200,
       valueGetter: (value) => new Date(value).toLocaleString(),
     },
+    {
+      field: 'checked_time',
+      headerName: 'Last Checked',
+      width: 200,
+      valueGetter: (value) => value ? new Date(value).toLocaleString() : '',
+    },
     {
       field: 'update',
       headerName: 'Update',
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from pandas import Series
+
+from api.services.cached_data.list_prices import ListPrices
+
+LIST_PRICE_ROWS = [
+  ("GUC-BAG-0001/S", 120),
+  ("GUC-BAG-0001/M", "129.99"),
+  ("PRA-SHO-0002/9", ""),
+  ("PRA-SHO-0002/10", "N/A"),
+  ("GUC-BAG-0001/S", 135.5),
+]
+
+def get_dict_list_prices(skus: Series) -> Series:
+  """
+  Looks up the list prices like the sku-to-list-price dict the store replaced (the last price of a
+  SKU listed more than once wins, and prices that are not numbers are NaN).
+  """
+  sku_to_list_price = {sku: price for sku, price in LIST_PRICE_ROWS}
+  return pd.to_numeric(skus.map(sku_to_list_price), errors="coerce").astype(np.float64)
+
+def create_list_prices() -> ListPrices:
+  return ListPrices(
+    skus=[sku for sku, _ in LIST_PRICE_ROWS], prices=[price for _, price in LIST_PRICE_ROWS],
+  )
+
+def test_hits_misses_and_duplicates_match_the_dict_lookup():
+  skus = Series(
+    ["GUC-BAG-0001/S", "GUC-BAG-0001/M", "MISSING-0001/S", "PRA-SHO-0002/9", "PRA-SHO-0002/10"],
+  )
+
+  list_prices = create_list_prices().get_list_prices(skus=skus)
+
+  pd.testing.assert_series_equal(list_prices, get_dict_list_prices(skus=skus))
+  assert list_prices.tolist()[:2] == [135.5, 129.99]
+
+def test_categorical_skus_match_the_dict_lookup():
+  skus = Series(
+    ["GUC-BAG-0001/M", None, "MISSING-0001/S", "GUC-BAG-0001/S", "GUC-BAG-0001/M"],
+    index=[10, 11, 12, 13, 14], dtype="category",
+  )
+
+  list_prices = create_list_prices().get_list_prices(skus=skus)
+
+  pd.testing.assert_series_equal(
+    list_prices, get_dict_list_prices(skus=skus.astype(object)), check_names=False,
+  )
+
+def test_unknown_skus_around_the_sorted_hashes_are_misses():
+  list_prices = create_list_prices()
+  skus = Series([f"UNKNOWN-{number:04d}/S" for number in range(1000)])
+
+  assert list_prices.get_list_prices(skus=skus).isna().all()
+
+def test_empty_store_returns_no_prices():
+  list_prices = ListPrices(skus=[], prices=[])
+
+  assert len(list_prices) == 0
+  assert list_prices.get_list_prices(skus=Series(["GUC-BAG-0001/S"])).isna().all()
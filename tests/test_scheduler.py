@@ -0,0 +1,50 @@
+from typing import List
+import pytest
+
+from api.services.cached_data.cached_dataset import CachedDataset
+from api.services.cached_data.scheduler import cache_scheduler, get_refresh_order
+
+async def load_nothing() -> None:
+  return None
+
+def create_dataset(name: str, dependencies: List[CachedDataset] | None = None) -> CachedDataset:
+  return CachedDataset(
+    name=name, title=name.title(), load=load_nothing, empty_data=None, dependencies=dependencies,
+  )
+
+def test_scheduled_datasets_refresh_after_their_dependencies():
+  refresh_order = [dataset.name for dataset in cache_scheduler.refresh_order]
+
+  assert sorted(refresh_order) == sorted(cache_scheduler.datasets)
+  assert refresh_order.index("sku_po_tool") < refresh_order.index("aliases")
+  assert refresh_order.index("list_prices") < refresh_order.index("sales_reports")
+  assert refresh_order.index("marketplaces") < refresh_order.index("sales_reports")
+
+  for dataset in cache_scheduler.refresh_order:
+    for dependency in dataset.dependencies:
+      assert refresh_order.index(dependency.name) < refresh_order.index(dataset.name)
+
+def test_independent_datasets_keep_their_order():
+  sheet = create_dataset(name="sheet")
+  index = create_dataset(name="index", dependencies=[sheet])
+  prices = create_dataset(name="prices")
+
+  refresh_order = get_refresh_order(datasets=[index, sheet, prices])
+
+  assert [dataset.name for dataset in refresh_order] == ["sheet", "prices", "index"]
+
+def test_circular_dependencies_are_rejected():
+  sheet = create_dataset(name="sheet")
+  index = create_dataset(name="index", dependencies=[sheet])
+  sheet.dependencies.append(index)
+  prices = create_dataset(name="prices")
+
+  with pytest.raises(ValueError, match="circular dependencies: Index, Sheet"):
+    get_refresh_order(datasets=[index, sheet, prices])
+
+def test_unscheduled_dependencies_are_rejected():
+  sheet = create_dataset(name="sheet")
+  index = create_dataset(name="index", dependencies=[sheet])
+
+  with pytest.raises(ValueError, match="not scheduled"):
+    get_refresh_order(datasets=[index])
@@ -0,0 +1,67 @@
+from datetime import datetime
+from pathlib import Path
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.services.cached_data import snapshots
+
+@pytest.fixture(autouse=True)
+def snapshots_folder(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+  monkeypatch.setattr(snapshots, "snapshots_folder", tmp_path)
+  return tmp_path
+
+def test_saved_snapshot_loads_the_same_data(snapshots_folder: Path):
+  update_time = datetime(year=2026, month=1, day=2, hour=3)
+  sales_frame = pd.DataFrame({
+    "SKU": pd.Categorical(["A/S", "B/M", "A/S"]),
+    "Qty": np.array([1, 2, 3], dtype=np.int64),
+    "MSRP": np.array([10.5, 20.0, np.nan]),
+    "Marketplace": ["Amazon", "eBay", ""],
+  })
+  sku_hashes = np.arange(7, dtype=np.uint64)
+
+  snapshots.save_snapshot(
+    name="sales", data={"frame": sales_frame, "hashes": sku_hashes, "months": 12},
+    update_time=update_time,
+  )
+  snapshot = snapshots.load_snapshot(name="sales")
+
+  assert snapshot is not None
+  assert snapshot["update_time"] == update_time
+  pd.testing.assert_frame_equal(snapshot["data"]["frame"], sales_frame)
+  np.testing.assert_array_equal(snapshot["data"]["hashes"], sku_hashes)
+  assert snapshot["data"]["months"] == 12
+  assert [path.name for path in snapshots_folder.iterdir()] == ["sales.snapshot"]
+
+def test_array_buffers_are_aligned(snapshots_folder: Path):
+  snapshots.save_snapshot(
+    name="prices", data=[np.arange(3, dtype=np.uint8), np.arange(5, dtype=np.float64)],
+    update_time=datetime.now(),
+  )
+
+  snapshot_view = memoryview((snapshots_folder / "prices.snapshot").read_bytes())
+  _, buffers = snapshots.read_snapshot_sections(snapshot_view=snapshot_view)
+  file_address = np.frombuffer(snapshot_view, dtype=np.uint8).ctypes.data
+
+  assert len(buffers) == 2
+  for buffer in buffers:
+    buffer_offset = np.frombuffer(buffer, dtype=np.uint8).ctypes.data - file_address
+    assert buffer_offset % snapshots.BUFFER_ALIGNMENT == 0
+
+def test_snapshot_of_an_older_version_is_ignored(monkeypatch: pytest.MonkeyPatch):
+  snapshots.save_snapshot(name="sales", data={"months": 12}, update_time=datetime.now())
+  monkeypatch.setattr(snapshots, "SNAPSHOT_VERSION", snapshots.SNAPSHOT_VERSION + 1)
+
+  assert snapshots.load_snapshot(name="sales") is None
+
+def test_file_without_the_snapshot_marker_is_ignored(snapshots_folder: Path):
+  (snapshots_folder / "sales.snapshot").write_bytes(
+    pickle.dumps({"version": snapshots.SNAPSHOT_VERSION, "update_time": datetime.now(), "data": {}}),
+  )
+
+  assert snapshots.load_snapshot(name="sales") is None
+
+def test_missing_snapshot_is_none():
+  assert snapshots.load_snapshot(name="sales") is None
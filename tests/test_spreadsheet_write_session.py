@@ -0,0 +1,153 @@
+from typing import Any, Dict, List
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from api.services.google_api import sheets_utils
+from api.models.sheets import SheetProperties
+
+class FakeSheetsServices:
+  """
+  Records the Sheets API calls of a write session. Update requests with sheet IDs that are not
+  in sheet_ids are rejected like the Sheets API rejects them.
+  """
+  def __init__(self, sheet_ids: Dict[str, int]) -> None:
+    self.sheet_ids = sheet_ids
+    self.calls: List[Any] = []
+
+  async def batch_post_values(
+    self, value_ranges: List[Dict[str, Any]], spreadsheet_id: str,
+  ) -> None:
+    self.calls.append(("batch_post_values", spreadsheet_id, value_ranges))
+
+  async def get_sheet_ids(self, spreadsheet_id: str) -> Dict[str, int]:
+    self.calls.append(("get_sheet_ids", spreadsheet_id))
+    return dict(self.sheet_ids)
+
+  async def update_spreadsheet(self, requests: List[Dict[str, Any]], spreadsheet_id: str) -> None:
+    self.calls.append(("update_spreadsheet", spreadsheet_id, requests))
+
+    for request in requests:
+      sheet_id = request["updateSheetProperties"]["properties"]["sheetId"]
+      if sheet_id not in self.sheet_ids.values():
+        raise HTTPException(status_code=400, detail=f"No grid with id: {sheet_id}")
+
+@pytest.fixture
+def fake_sheets(monkeypatch: pytest.MonkeyPatch) -> FakeSheetsServices:
+  fake_sheets = FakeSheetsServices(sheet_ids={"Breakdown": 1, "Worksheet": 2})
+
+  for name in ["batch_post_values", "get_sheet_ids", "update_spreadsheet"]:
+    monkeypatch.setattr(sheets_utils.sheets_services, name, getattr(fake_sheets, name))
+
+  return fake_sheets
+
+def create_properties(sheet_name: str) -> SheetProperties:
+  return SheetProperties(id="spreadsheet", sheet_name=sheet_name, required_headers=["SKU", "Qty"])
+
+def get_row_count_requests(sheet_rows: Dict[int, int]) -> List[Dict[str, Any]]:
+  return [
+    {
+      "updateSheetProperties": {
+        "properties": {"sheetId": sheet_id, "gridProperties": {"rowCount": row_count}},
+        "fields": "gridProperties.rowCount",
+      }
+    }
+    for sheet_id, row_count in sheet_rows.items()
+  ]
+
+def test_commit_posts_all_values_and_trims_all_sheets_at_once(fake_sheets: FakeSheetsServices):
+  write_session = sheets_utils.SpreadsheetWriteSession(spreadsheet_id="spreadsheet")
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Breakdown"),
+    row_dicts=[{"SKU": "A/S", "Qty": 1}, {"Qty": 2}],
+  )
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Worksheet"), row_dicts=[{"SKU": "B/M", "Qty": 3}],
+  )
+  write_session.post_values(sheet_name="Validation's", values=[["x"]], cell_range="G2:G2")
+
+  asyncio.run(write_session.commit())
+
+  last_column = sheets_utils.index_to_column_letter(2)
+  assert fake_sheets.calls == [
+    ("batch_post_values", "spreadsheet", [
+      {"range": f"'Breakdown'!A2:{last_column}3", "values": [["A/S", 1], ["", 2]]},
+      {"range": f"'Worksheet'!A2:{last_column}2", "values": [["B/M", 3]]},
+      {"range": "'Validation''s'!G2:G2", "values": [["x"]]},
+    ]),
+    ("get_sheet_ids", "spreadsheet"),
+    ("update_spreadsheet", "spreadsheet", get_row_count_requests(sheet_rows={1: 3, 2: 2})),
+  ]
+  assert write_session.value_ranges == [] and write_session.row_counts == {}
+
+def test_sheet_ids_are_fetched_once_per_session(fake_sheets: FakeSheetsServices):
+  write_session = sheets_utils.SpreadsheetWriteSession(spreadsheet_id="spreadsheet")
+
+  for _ in range(2):
+    write_session.post_row_dicts(
+      ss_properties=create_properties(sheet_name="Breakdown"), row_dicts=[{"SKU": "A/S"}],
+    )
+    asyncio.run(write_session.commit())
+
+  assert [call[0] for call in fake_sheets.calls].count("get_sheet_ids") == 1
+
+def test_rejected_sheet_id_is_refetched_once(fake_sheets: FakeSheetsServices):
+  write_session = sheets_utils.SpreadsheetWriteSession(spreadsheet_id="spreadsheet")
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Worksheet"), row_dicts=[{"SKU": "B/M"}],
+  )
+  asyncio.run(write_session.commit())
+
+  # The sheet is replaced (with a new ID) after the session fetched the sheet IDs
+  fake_sheets.sheet_ids["Worksheet"] = 7
+  fake_sheets.calls = []
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Worksheet"), row_dicts=[{"SKU": "B/M"}],
+  )
+  asyncio.run(write_session.commit())
+
+  assert [call[0] for call in fake_sheets.calls] == [
+    "batch_post_values", "update_spreadsheet", "get_sheet_ids", "update_spreadsheet",
+  ]
+  assert fake_sheets.calls[-1][2] == get_row_count_requests(sheet_rows={7: 2})
+
+def test_other_rejected_trims_are_raised_without_refetching(
+  fake_sheets: FakeSheetsServices, monkeypatch: pytest.MonkeyPatch,
+):
+  async def reject_update(requests: List[Dict[str, Any]], spreadsheet_id: str) -> None:
+    fake_sheets.calls.append(("update_spreadsheet", spreadsheet_id, requests))
+    raise HTTPException(status_code=400, detail="Invalid requests[0]: rowCount is invalid")
+
+  monkeypatch.setattr(sheets_utils.sheets_services, "update_spreadsheet", reject_update)
+
+  write_session = sheets_utils.SpreadsheetWriteSession(spreadsheet_id="spreadsheet")
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Breakdown"), row_dicts=[{"SKU": "A/S"}],
+  )
+
+  with pytest.raises(HTTPException):
+    asyncio.run(write_session.commit())
+
+  assert [call[0] for call in fake_sheets.calls] == [
+    "batch_post_values", "get_sheet_ids", "update_spreadsheet",
+  ]
+  assert write_session.row_counts == {"Breakdown": 2}
+
+def test_failed_write_raises_and_keeps_the_queues(
+  fake_sheets: FakeSheetsServices, monkeypatch: pytest.MonkeyPatch,
+):
+  async def reject_values(value_ranges: List[Dict[str, Any]], spreadsheet_id: str) -> None:
+    raise HTTPException(status_code=400, detail="Unable to parse range")
+
+  monkeypatch.setattr(sheets_utils.sheets_services, "batch_post_values", reject_values)
+
+  write_session = sheets_utils.SpreadsheetWriteSession(spreadsheet_id="spreadsheet")
+  write_session.post_row_dicts(
+    ss_properties=create_properties(sheet_name="Breakdown"), row_dicts=[{"SKU": "A/S"}],
+  )
+
+  with pytest.raises(HTTPException):
+    asyncio.run(write_session.commit())
+
+  assert "update_spreadsheet" not in [call[0] for call in fake_sheets.calls]
+  assert len(write_session.value_ranges) == 1 and write_session.row_counts == {"Breakdown": 2}
@@ -0,0 +1,19 @@
+from api.services.po_utils import validation_engine
+
+def test_mixed_int_and_float_qty_only_flags_the_float():
+  frame = validation_engine.create_validation_frame(
+    row_dicts=[{"Qty": 5}, {"Qty": 2.5}, {"Qty": 3}],
+  )
+
+  errors = validation_engine.check_positive_number(frame=frame, column="Qty", integer=True)
+
+  assert errors.tolist() == ["", "Qty is not a valid number", ""]
+
+def test_integer_size_matches_valid_sizes():
+  frame = validation_engine.create_validation_frame(
+    row_dicts=[{"Size": 9}, {"Size": 10.5}],
+  )
+
+  errors = validation_engine.check_in_set(frame=frame, column="Size", valid_values={"9", "10.5"})
+
+  assert errors.tolist() == ["", ""]